@@ -0,0 +1,418 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import pandas as pd
+
+from anomalies import flagged_transactions, score_later_transactions, score_transactions
+from counterparties import COUNTERPARTY_COLUMNS, add_counterparties, intern_counterparties
+from extraction import TIME_DIMENSIONS, add_time_dimensions
+
+TIME_PERIODS = ("Daily", "Monthly", "6 Months", "Yearly")
+CATEGORY_PERIODS = ("Daily", "Monthly", "Yearly")
+
+# Define the keywords for send and receive money transactions
+SEND_KEYWORDS = ["Customer Transfer Fuliza MPesa", "Customer Transfer to -"]
+RECEIVE_KEYWORDS = ["Funds received from -"]
+TRANSFER_KEYWORDS = ["Customer Transfer to -", "Funds received from -"]
+
+# Define the charges categories
+CHARGES_CATEGORIES = ["Charges (Till)", "Charges (Send Money)", "Charges (Paybill)"]
+
+# Number of reports kept in memory, keyed by statement hash
+MAX_CACHED_REPORTS = 32
+
+# Time buckets of the rollup cube and the columns that key each of them
+CUBE_GRANULARITIES = {
+    "day": ["Day"],
+    "month": ["Month"],
+    "half_year": ["Year", "Half Year"],
+    "year": ["Year"],
+    "weekday_hour": ["Day of Week", "Hour"],
+}
+
+# Cube granularity behind each "Select Time Period" option
+PERIOD_GRANULARITIES = {"Daily": "day", "Monthly": "month", "6 Months": "half_year", "Yearly": "year"}
+
+
+@dataclass(frozen=True)
+class ReportData:
+    """Every aggregate shown on the Your Report page, computed once per statement"""
+    total_transactions: int
+    total_incoming: float
+    total_outgoing: float
+    incoming_top_categories_by_volume: pd.DataFrame
+    outgoing_top_categories_by_volume: pd.DataFrame
+    incoming_top_categories_by_value: pd.DataFrame
+    outgoing_top_categories_by_value: pd.DataFrame
+    incoming_by_category: pd.Series
+    outgoing_by_category: pd.Series
+    top_senders_by_amount: pd.DataFrame
+    top_recipients_by_amount: pd.DataFrame
+    balance_over_time: pd.DataFrame
+    cumulative_totals: pd.DataFrame
+    incoming_amounts: pd.Series
+    outgoing_amounts: pd.Series
+    savings_deposits: pd.DataFrame
+    savings_withdrawals: pd.DataFrame
+    transaction_counts: pd.DataFrame
+    average_amount_by_recipient: pd.DataFrame
+    frequent_senders: pd.DataFrame
+    frequent_recipients: pd.DataFrame
+    anomalies: pd.DataFrame
+    cube: "RollupCube"
+
+
+def matches_keywords(details, keywords):
+    return details.str.contains('|'.join(keywords), case=False, na=False)
+
+
+@dataclass(frozen=True)
+class RollupCube:
+    """Transaction counts and amounts per direction, category and time bucket
+
+    Built once per statement with one groupby per entry of CUBE_GRANULARITIES;
+    every time-series, heatmap and category-trend chart slices it, so switching
+    a time period costs O(buckets) rather than a pass over the transactions.
+    Amounts are Paid In for incoming and absolute Withdrawn for outgoing rows.
+    Rows without a Completion Time are left out.
+    """
+    tables: dict
+
+    @classmethod
+    def build(cls, incoming, outgoing):
+        columns = ["Category", "Completion Time"] + TIME_DIMENSIONS
+        rows = pd.concat([
+            incoming[columns].assign(Direction="Incoming", Amount=incoming["Paid In"]),
+            outgoing[columns].assign(Direction="Outgoing", Amount=outgoing["Withdrawn"]),
+        ], ignore_index=True)
+        rows["Day"] = rows["Completion Time"].dt.normalize()
+        rows = rows[rows["Completion Time"].notna()]
+
+        tables = {
+            granularity: rows.groupby(["Direction", "Category"] + keys, observed=True)["Amount"].agg(Count="size", Amount="sum")
+            for granularity, keys in CUBE_GRANULARITIES.items()
+        }
+        return cls(tables)
+
+    def combine(self, other):
+        """The cube of two disjoint sets of transactions, summed bucket by bucket
+
+        Costs O(buckets), so transactions added to a ledger are rolled up on
+        their own and folded into the cube of the rows already there.
+        """
+        tables = {}
+        for granularity, table in self.tables.items():
+            other_table = other.tables[granularity]
+            combined = table.add(other_table, fill_value=0).astype({"Count": table["Count"].dtype})
+            # Aligning Category levels with different categories leaves objects; restore the shared dtype
+            levels = [t.index.levels[t.index.names.index("Category")] for t in (table, other_table)]
+            if all(isinstance(level.dtype, pd.CategoricalDtype) for level in levels):
+                dtype = pd.CategoricalDtype(levels[0].categories.union(levels[1].categories))
+                category = combined.index.names.index("Category")
+                combined.index = combined.index.set_levels(combined.index.levels[category].astype(dtype), level=category)
+                combined = combined.sort_index()
+            tables[granularity] = combined
+        return RollupCube(tables)
+
+    def slice(self, granularity, direction, categories=None):
+        """Count and Amount per (Category, bucket) for one direction"""
+        table = self.tables[granularity]
+        table = table[table.index.get_level_values("Direction") == direction].droplevel("Direction")
+        if categories is not None:
+            table = table[table.index.get_level_values("Category").isin(categories)]
+        return table
+
+    def totals(self, granularity, direction, categories=None):
+        """Count and Amount per bucket, summed over categories"""
+        return self.slice(granularity, direction, categories).groupby(level=CUBE_GRANULARITIES[granularity]).sum()
+
+    def volume_over_time(self, direction, time_period):
+        """Transaction counts per bucket for one of TIME_PERIODS"""
+        counts = self.totals(PERIOD_GRANULARITIES[time_period], direction)["Count"]
+        if time_period == "Daily":
+            # Group by day
+            labels = pd.Index(counts.index.date, name="Completion Time")
+        elif time_period == "Monthly":
+            # Month Periods as strings
+            labels = counts.index.astype(str)
+        elif time_period == "6 Months":
+            # Half years labelled like 2024-2H
+            labels = pd.Index([f"{year}-{half}H" for year, half in counts.index], name="6 Months Period")
+        else:
+            # Years stay integers
+            labels = counts.index
+        return pd.DataFrame({labels.name: labels, "Transaction Count": counts.to_numpy()})
+
+    def weekday_hour_amounts(self, direction):
+        """Day of Week x Hour amount table for the hourly heatmaps"""
+        return self.totals("weekday_hour", direction)["Amount"].unstack().fillna(0)
+
+    def monthly_amounts(self, direction, categories):
+        """Long table of month-end date, Category and amount for stacked bars"""
+        amounts = self.slice("month", direction, categories)["Amount"].reset_index()
+        amounts["Month"] = amounts["Month"].dt.to_timestamp(how="end").dt.normalize()
+        return amounts
+
+    def incoming_by_category_and_period(self, time_period):
+        """Category x bucket table of money in for one of CATEGORY_PERIODS
+
+        Daily groups by day of week. Categories and buckets seen only on the
+        outgoing side are kept as zero rows and columns.
+        """
+        if time_period == "Daily":
+            granularity, key = "weekday_hour", "Day of Week"
+        else:
+            granularity, key = PERIOD_GRANULARITIES[time_period], CUBE_GRANULARITIES[PERIOD_GRANULARITIES[time_period]][0]
+        table = self.tables[granularity]["Amount"].groupby(level=["Direction", "Category", key], observed=True).sum()
+        categories = table.index.get_level_values("Category").unique().sort_values()
+        buckets = table.index.get_level_values(key).unique().sort_values()
+
+        amounts = table[table.index.get_level_values("Direction") == "Incoming"].droplevel("Direction").unstack()
+        amounts = amounts.reindex(index=categories, columns=buckets).fillna(0)
+        if time_period != "Daily":
+            amounts.columns = amounts.columns.astype(str)
+        return amounts
+
+
+def with_ingest_columns(transaction_data, incoming_transactions, outgoing_transactions):
+    """The three frames with the columns derived at ingest, computed here for older inputs
+
+    Statements parsed by extraction already carry parsed Completion Time, the
+    TIME_DIMENSIONS and the COUNTERPARTY_COLUMNS; frames without them (e.g.
+    loaded from an old CSV) get them computed once on the full frame and
+    shared by index.
+    """
+    derived = []
+    if not all(column in transaction_data.columns for column in TIME_DIMENSIONS):
+        transaction_data = add_time_dimensions(transaction_data.copy())
+        derived += ["Completion Time"] + TIME_DIMENSIONS
+    if not all(column in transaction_data.columns for column in COUNTERPARTY_COLUMNS):
+        transaction_data = add_counterparties(transaction_data.copy())
+        derived += COUNTERPARTY_COLUMNS
+    if not derived:
+        return transaction_data, incoming_transactions, outgoing_transactions
+
+    columns = transaction_data[derived]
+    incoming_transactions = incoming_transactions.drop(columns=derived, errors="ignore").join(columns)
+    outgoing_transactions = outgoing_transactions.drop(columns=derived, errors="ignore").join(columns)
+    intern_counterparties(transaction_data, incoming_transactions, outgoing_transactions)
+    return transaction_data, incoming_transactions, outgoing_transactions
+
+
+def category_counts(df):
+    """Transactions per Category, most frequent first; Categorical levels with no rows are left out"""
+    counts = df["Category"].value_counts()
+    return counts[counts > 0]
+
+
+def top_categories_by_volume(df):
+    return (
+        category_counts(df)
+        .head(5)
+        .rename_axis("Category")
+        .reset_index(name="Number of Transactions")
+    )
+
+
+def top_categories_by_value(df, amount_column):
+    return (
+        df.groupby("Category", observed=True)[amount_column].sum()
+        .abs()
+        .sort_values(ascending=False)
+        .head(5)
+        .reset_index()
+        .rename(columns={amount_column: "Amount"})
+    )
+
+
+def top_counterparties_by_amount(df, amount_column, label):
+    """Top 10 counterparties by total amount, grouped on the Categorical codes"""
+    return (
+        df.groupby(df["Counterparty"].rename(label), observed=True)[amount_column]
+        .sum()
+        .abs()
+        .sort_values(ascending=False)
+        .head(10)
+        .reset_index()
+        .rename(columns={amount_column: "Total Amount"})
+    )
+
+
+def most_frequent(df, label):
+    counts = df.groupby(df["Counterparty"].rename(label), observed=True).size()
+    return counts.sort_values(ascending=False, kind="stable").head(10).reset_index(name="Count")
+
+
+def running_total(amounts, start=0):
+    """Cumulative sum of ``amounts`` continuing from ``start``; missing amounts stay missing"""
+    if not start:
+        return amounts.cumsum()
+    # Summed in the same order as over the earlier amounts and these together
+    return pd.concat([pd.Series([start], dtype=amounts.dtype), amounts]).cumsum().iloc[1:]
+
+
+def row_fields(transaction_data, incoming, outgoing, totals=(0, 0), history=None):
+    """The ReportData fields with one row per transaction
+
+    ``totals`` are the Paid In and Withdrawn the cumulative totals start from,
+    and ``history`` the earlier incoming and outgoing rows, in time order,
+    the anomaly windows reach back into.
+    """
+    # Combine the transactions into a single dataframe, in time order
+    categorized = pd.concat([incoming, outgoing]).sort_values(by="Completion Time", kind="stable")
+    scores = score_transactions(categorized) if history is None else score_later_transactions(history, categorized)
+    return {
+        # Account balance over time
+        "balance_over_time": transaction_data[["Completion Time", "Balance"]].sort_values(by="Completion Time", kind="stable"),
+        "cumulative_totals": pd.DataFrame({
+            "Completion Time": categorized["Completion Time"],
+            "Cumulative Paid In": running_total(categorized["Paid In"], totals[0]),
+            "Cumulative Withdrawn": running_total(categorized["Withdrawn"], totals[1]),
+        }),
+        "incoming_amounts": incoming["Paid In"],
+        "outgoing_amounts": outgoing["Withdrawn"],
+        "savings_deposits": categorized.loc[categorized["Category"] == "M-Shwari Deposit", ["Completion Time", "Withdrawn"]],
+        "savings_withdrawals": categorized.loc[categorized["Category"] == "M-Shwari Withdrawal", ["Completion Time", "Paid In"]],
+        "anomalies": flagged_transactions(categorized, scores),
+    }
+
+
+def appended(earlier, later):
+    """``later`` appended to ``earlier``, in the dtypes of ``later``"""
+    if len(earlier) == 0:
+        return later
+    # Categoricals of the earlier rows hold a subset of the later rows' categories
+    earlier = earlier.astype(later.dtypes.to_dict() if isinstance(later, pd.DataFrame) else later.dtype)
+    return pd.concat([earlier, later]) if len(later) else earlier
+
+
+def extended_row_fields(report, rows, transaction_data, incoming, outgoing):
+    """The row fields of ``report``, the report of the first ``rows`` transactions, extended with the rest
+
+    The transactions are indexed by position, and every one past ``rows``
+    follows all of the first ``rows`` in time, so the earlier rows' series
+    and scores stay as they are.
+    """
+    earlier_incoming, earlier_outgoing = incoming[incoming.index < rows], outgoing[outgoing.index < rows]
+    columns = ["Completion Time", "Category"]
+    history = pd.concat([
+        earlier_incoming[columns + ["Paid In"]], earlier_outgoing[columns + ["Withdrawn"]],
+    ]).sort_values(by="Completion Time", kind="stable")
+    cumulative = report.cumulative_totals
+    totals = tuple(
+        cumulative[column].dropna().iloc[-1] if cumulative[column].notna().any() else 0
+        for column in ("Cumulative Paid In", "Cumulative Withdrawn")
+    )
+
+    later = row_fields(transaction_data[transaction_data.index >= rows], incoming[incoming.index >= rows],
+                       outgoing[outgoing.index >= rows], totals, history)
+    fields = {name: appended(getattr(report, name), rows_of_later) for name, rows_of_later in later.items()}
+    fields["anomalies"] = fields["anomalies"].sort_values("Anomaly Score", ascending=False, kind="stable")
+    return fields
+
+
+def compute_report(transaction_data, incoming_transactions, outgoing_transactions, cube=None, previous=None):
+    """Compute every report aggregate for one categorized statement
+
+    The inputs are not modified. Time buckets and counterparties come from
+    the columns derived at ingest; counterparty tables group on the codes of
+    the Counterparty Categorical. A RollupCube already built for these
+    transactions is used as given instead of being rebuilt.
+
+    ``previous`` is a (ReportData, rows) pair for transactions that extend
+    the first ``rows`` of them with later ones (see extended_row_fields):
+    the per-row series, balance and cumulative totals, amounts, savings and
+    anomaly scores, are computed for the later rows only. The aggregates are
+    computed over every row.
+    """
+    transaction_data, incoming_transactions, outgoing_transactions = with_ingest_columns(
+        transaction_data, incoming_transactions, outgoing_transactions
+    )
+
+    incoming = incoming_transactions
+    # Convert all negative values in the 'Withdrawn' column to positive
+    outgoing = outgoing_transactions.assign(Withdrawn=outgoing_transactions["Withdrawn"].abs())
+
+    incoming_filtered = incoming[matches_keywords(incoming["Details"], RECEIVE_KEYWORDS)]
+    outgoing_filtered = outgoing[matches_keywords(outgoing["Details"], SEND_KEYWORDS)]
+
+    if previous is None:
+        rows = row_fields(transaction_data, incoming, outgoing)
+    else:
+        rows = extended_row_fields(*previous, transaction_data, incoming, outgoing)
+
+    categories = pd.concat([incoming[["Category"]], outgoing[["Category"]]])
+    transaction_counts = category_counts(categories).rename_axis("Category").reset_index(name="Count")
+
+    customer_transfers = outgoing[matches_keywords(outgoing["Details"], TRANSFER_KEYWORDS)]
+    average_amount_by_recipient = (
+        customer_transfers.groupby(customer_transfers["Counterparty"].rename("Recipient"), observed=True)["Withdrawn"]
+        .mean().abs().reset_index()
+        .sort_values(by="Withdrawn", ascending=False).head(10)
+    )
+
+    return ReportData(
+        total_transactions=transaction_data.shape[0],
+        total_incoming=incoming["Paid In"].sum(),
+        total_outgoing=outgoing["Withdrawn"].sum(),
+        incoming_top_categories_by_volume=top_categories_by_volume(incoming),
+        outgoing_top_categories_by_volume=top_categories_by_volume(outgoing),
+        incoming_top_categories_by_value=top_categories_by_value(incoming, "Paid In"),
+        outgoing_top_categories_by_value=top_categories_by_value(outgoing, "Withdrawn"),
+        incoming_by_category=incoming.groupby("Category", observed=True)["Paid In"].sum(),
+        outgoing_by_category=outgoing.groupby("Category", observed=True)["Withdrawn"].sum(),
+        top_senders_by_amount=top_counterparties_by_amount(incoming_filtered, "Paid In", "Sender"),
+        top_recipients_by_amount=top_counterparties_by_amount(outgoing_filtered, "Withdrawn", "Recipient"),
+        transaction_counts=transaction_counts,
+        average_amount_by_recipient=average_amount_by_recipient,
+        frequent_senders=most_frequent(incoming_filtered, "Sender"),
+        frequent_recipients=most_frequent(outgoing_filtered, "Recipient"),
+        cube=cube if cube is not None else RollupCube.build(incoming, outgoing),
+        **rows,
+    )
+
+
+def report_key(key, statement):
+    """Cache key of a statement's report: its hash and the rules its categories came from"""
+    if key is None or statement.rules_version is None:
+        return key
+    return f"{key}-{statement.rules_version}"
+
+
+class ReportCache:
+    """Small LRU of computed reports keyed by statement hash"""
+
+    def __init__(self, max_entries=MAX_CACHED_REPORTS):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, statement):
+        """The report for a ParsedStatement, computed from its shilling views on a miss
+
+        On a miss, the latest report still cached of the statement's
+        ``report_bases`` is extended rather than computed again.
+        """
+        key = report_key(key, statement)
+        with self._lock:
+            report = self._entries.get(key)
+            if report is not None:
+                self._entries.move_to_end(key)
+                return report
+            previous = next(
+                ((self._entries[base], rows) for base, rows in reversed(statement.report_bases) if base in self._entries),
+                None,
+            )
+
+        report = compute_report(statement.transaction_data, statement.incoming_transactions, statement.outgoing_transactions,
+                                cube=statement.cube, previous=previous)
+        if key is not None:
+            with self._lock:
+                self._entries[key] = report
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return report
+
+
+report_cache = ReportCache()
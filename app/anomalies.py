@@ -0,0 +1,197 @@
+"""Flag unusual transactions with per-category rolling robust z-scores
+
+Every transaction is compared with the transactions before it in the same
+category: the robust z-score of its amount, and of the time since the
+previous transaction of that category, against the median and interquartile
+range of a rolling window. Amounts and gaps are compared on a log scale,
+where their spread is far more even. An IsolationForest fit on the same
+features can add a multivariate score; fitted forests are cached per set of
+categories.
+
+All groups are scored in one vectorized pass over one frame, so a multi-year
+ledger, or the transactions of hundreds of statements grouped by a statement
+column, cost a single call. Transactions appended after a scored history are
+scored against the latest window of each category alone.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Earlier transactions of the same category each transaction is compared with
+ANOMALY_WINDOW = 50
+
+# Earlier transactions needed before a z-score is given
+ANOMALY_MIN_HISTORY = 8
+
+# Robust z-score from which a transaction is flagged (Iglewicz and Hoaglin's cut-off)
+ANOMALY_Z_THRESHOLD = 3.5
+
+# Smallest spread assumed on the log scale, so fixed-price categories (bundles) do not flag small differences
+MIN_LOG_SCALE = 0.1
+
+# Interquartile range of a normal distribution, in standard deviations
+IQR_TO_SIGMA = 1.349
+
+# IsolationForest settings and the number of fitted forests kept
+ISOLATION_TREES = 100
+ISOLATION_CONTAMINATION = 0.01
+MAX_CACHED_MODELS = 16
+
+# Columns of score_transactions(); the isolation columns only when the forest is used
+SCORE_COLUMNS = ["Amount Z", "Interval Z", "Anomaly Score", "Anomaly"]
+ISOLATION_COLUMNS = ["Isolation Score", "Isolation Anomaly"]
+
+
+def transaction_amounts(transactions):
+    """Absolute amount of every row: Paid In, else Withdrawn"""
+    amounts = pd.Series(np.nan, index=transactions.index)
+    for column in ("Withdrawn", "Paid In"):
+        if column in transactions.columns:
+            amounts = transactions[column].astype("float64").abs().fillna(amounts)
+    return amounts
+
+
+def robust_z(values, groups):
+    """Robust z-score of each value against the window of earlier values in its group
+
+    ``values`` are in group-then-time order. The current value is left out of
+    its own window, so a single outlier cannot hide itself.
+    """
+    previous = values.groupby(groups, observed=True, sort=False).shift()
+    rolling = previous.groupby(groups, observed=True, sort=False).rolling(ANOMALY_WINDOW, min_periods=ANOMALY_MIN_HISTORY)
+    # groupby().rolling() puts the group keys in front of the row position
+    median, lower, upper = (
+        statistic.droplevel(list(range(len(groups)))).sort_index()
+        for statistic in (rolling.median(), rolling.quantile(0.25), rolling.quantile(0.75))
+    )
+    scale = np.maximum((upper - lower) / IQR_TO_SIGMA, MIN_LOG_SCALE)
+    return (values - median) / scale
+
+
+def anomaly_features(transactions, group_by=()):
+    """Log amount, log gap to the previous transaction of the category, and their robust z-scores
+
+    Rows are grouped by ``group_by`` (e.g. a statement column) and Category.
+    The result is indexed like ``transactions``.
+    """
+    keys = list(group_by) + ["Category"]
+    frame = transactions[keys + ["Completion Time"]].assign(**{"Log Amount": np.log1p(transaction_amounts(transactions))})
+    # Positional index, in group-then-time order, so every window and gap looks back in time
+    frame = frame.reset_index(drop=True).sort_values(keys + ["Completion Time"], kind="stable")
+    groups = [frame[key] for key in keys]
+
+    gaps = frame.groupby(keys, observed=True, sort=False)["Completion Time"].diff().dt.total_seconds()
+    frame["Log Gap"] = np.log1p(gaps.clip(lower=0))
+    frame["Amount Z"] = robust_z(frame["Log Amount"], groups)
+    frame["Interval Z"] = robust_z(frame["Log Gap"], groups)
+
+    features = frame.sort_index()[["Log Amount", "Log Gap", "Amount Z", "Interval Z"]]
+    features.index = transactions.index
+    return features
+
+
+class IsolationModels:
+    """IsolationForests fit on the anomaly features, one per set of categories
+
+    The categories are one-hot columns of the feature matrix, so a forest
+    only fits data with the same set; statements sharing one reuse it.
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_MODELS):
+        self.max_entries = max_entries
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_fit(self, categories, matrix):
+        with self._lock:
+            model = self._models.get(categories)
+            if model is not None:
+                self._models.move_to_end(categories)
+                return model
+
+        # scikit-learn is only loaded once a forest is asked for
+        from sklearn.ensemble import IsolationForest
+        model = IsolationForest(
+            n_estimators=ISOLATION_TREES, contamination=ISOLATION_CONTAMINATION, random_state=0
+        ).fit(matrix)
+        with self._lock:
+            self._models[categories] = model
+            while len(self._models) > self.max_entries:
+                self._models.popitem(last=False)
+        return model
+
+    def __len__(self):
+        with self._lock:
+            return len(self._models)
+
+
+isolation_models = IsolationModels()
+
+
+def isolation_matrix(transactions, features, categories):
+    """Feature matrix for the forest: the engineered features, time of day and week, one-hot Category"""
+    times = transactions["Completion Time"]
+    numeric = pd.DataFrame({
+        "Log Amount": features["Log Amount"],
+        "Log Gap": features["Log Gap"].fillna(features["Log Gap"].median()),
+        "Amount Z": features["Amount Z"].fillna(0),
+        "Interval Z": features["Interval Z"].fillna(0),
+        "Hour": times.dt.hour,
+        "Day of Week": times.dt.dayofweek,
+    }).fillna(0)
+    one_hot = pd.get_dummies(pd.Categorical(transactions["Category"].astype(str), categories=categories), dtype="float64")
+    return np.hstack([numeric.to_numpy(dtype="float64"), one_hot.to_numpy()])
+
+
+def score_transactions(transactions, group_by=(), isolation_forest=False):
+    """Anomaly scores of every transaction, indexed like ``transactions``
+
+    ``transactions`` needs Completion Time, Category and Paid In and/or
+    Withdrawn. Anomaly Score is the larger of the absolute amount z-score and
+    the negated interval z-score (a burst of transactions is unusual, a long
+    gap is not); Anomaly flags scores of ANOMALY_Z_THRESHOLD and above. With
+    ``isolation_forest`` the rows are also scored, in one batch, by a forest
+    cached for their set of categories.
+    """
+    features = anomaly_features(transactions, group_by)
+    score = np.fmax(features["Amount Z"].abs(), (-features["Interval Z"]).clip(lower=0)).fillna(0)
+    scores = pd.DataFrame({
+        "Amount Z": features["Amount Z"],
+        "Interval Z": features["Interval Z"],
+        "Anomaly Score": score,
+        "Anomaly": score >= ANOMALY_Z_THRESHOLD,
+    })
+
+    if isolation_forest and len(transactions):
+        categories = tuple(sorted(transactions["Category"].dropna().astype(str).unique()))
+        matrix = isolation_matrix(transactions, features, categories)
+        model = isolation_models.get_or_fit(categories, matrix)
+        # score_samples is higher for normal rows; negate so higher means more anomalous
+        scores["Isolation Score"] = -model.score_samples(matrix)
+        scores["Isolation Anomaly"] = model.predict(matrix) == -1
+    return scores
+
+
+def score_later_transactions(history, transactions):
+    """Anomaly scores of ``transactions``, which all follow ``history`` in time, as if scored with it
+
+    ``history`` is in time order. Only the ANOMALY_WINDOW + 1 latest rows of
+    each category in it reach the windows and gaps of the later rows, so
+    only those are scored again.
+    """
+    history = history[history["Category"].isin(transactions["Category"].unique())]
+    earlier = history.groupby("Category", observed=True, sort=False).tail(ANOMALY_WINDOW + 1)
+    return score_transactions(pd.concat([earlier, transactions])).iloc[len(earlier):]
+
+
+def flagged_transactions(transactions, scores):
+    """The flagged rows with their amount and z-scores, most anomalous first"""
+    flagged = scores["Anomaly"]
+    if "Isolation Anomaly" in scores.columns:
+        flagged = flagged | scores["Isolation Anomaly"]
+    columns = [column for column in ("Completion Time", "Details", "Category") if column in transactions.columns]
+    table = transactions.loc[flagged, columns].assign(Amount=transaction_amounts(transactions)[flagged])
+    table = table.join(scores.loc[flagged].drop(columns=["Anomaly", "Isolation Anomaly"], errors="ignore"))
+    return table.sort_values("Anomaly Score", ascending=False, kind="stable")
@@ -0,0 +1,290 @@
+"""HTTP API for statement analysis, runnable without the Streamlit UI
+
+Businesses submit a statement PDF and fetch its categorized transactions
+(JSON or Arrow) and report aggregates (JSON). Parsing and categorization are
+the same code the Streamlit app runs; statements are parsed on a bounded
+process pool and land in the same statement cache and store. Once
+``--max-pending`` statements are waiting, new uploads get 503 with a
+Retry-After header instead of queueing without bound.
+
+    python app/api.py [--port 8000] [--workers 4] [--max-pending 16]
+
+    POST /statements[?wait=SECONDS]          body: the PDF
+    GET  /statements/<id>                    job status
+    GET  /statements/<id>/transactions[?format=json|arrow]
+    GET  /statements/<id>/report
+    GET  /statements/<id>/report.pdf         streamed from the rendered file
+    GET  /health
+"""
+import argparse
+import io
+import json
+import os
+import re
+import shutil
+import sys
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pyarrow as pa
+
+from analytics import report_cache
+from extraction import EXTRACTION_WORKERS, TIME_DIMENSIONS
+from jobs import DONE, FAILED, QUEUED, ProcessJobRunner, QueueFull
+from pdf_report import report_renderer
+from statement_cache import get_statement
+
+DEFAULT_PORT = 8000
+
+# Largest statement accepted, in bytes
+MAX_UPLOAD_BYTES = 32 * 1024 * 1024
+
+# Longest a POST may block with ?wait= before it answers with the job status
+MAX_WAIT_SECONDS = 120
+
+# Bytes written per chunk when streaming a file to the client
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Seconds clients are told to back off when the queue is full
+RETRY_AFTER_SECONDS = 2
+
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+
+STATEMENT_ROUTE = re.compile(r"^/statements/(?P<key>[0-9a-f]{64})(?:/(?P<resource>transactions|report|report\.pdf))?/?$")
+
+
+def frame_records(frame):
+    """A DataFrame as JSON-ready records, with ISO timestamps and NaN as null"""
+    return json.loads(frame.to_json(orient="records", date_format="iso"))
+
+
+def export_transactions(statement):
+    """Categorized transactions in shillings, without the time buckets derived for the report"""
+    return statement.categorized_transactions().drop(columns=TIME_DIMENSIONS, errors="ignore")
+
+
+def arrow_stream(frame):
+    """A DataFrame serialized as an Arrow IPC stream"""
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def report_summary(report):
+    """The report aggregates a client needs, as plain JSON types"""
+    monthly = {}
+    for direction in ("Incoming", "Outgoing"):
+        totals = report.cube.totals("month", direction).reset_index()
+        totals["Month"] = totals["Month"].astype(str)
+        monthly[direction.lower()] = frame_records(totals)
+
+    return {
+        "total_transactions": int(report.total_transactions),
+        "total_incoming": float(report.total_incoming),
+        "total_outgoing": float(report.total_outgoing),
+        "incoming_by_category": {str(category): float(amount) for category, amount in report.incoming_by_category.items()},
+        "outgoing_by_category": {str(category): float(amount) for category, amount in report.outgoing_by_category.items()},
+        "transaction_counts": frame_records(report.transaction_counts),
+        "incoming_top_categories_by_volume": frame_records(report.incoming_top_categories_by_volume),
+        "outgoing_top_categories_by_volume": frame_records(report.outgoing_top_categories_by_volume),
+        "incoming_top_categories_by_value": frame_records(report.incoming_top_categories_by_value),
+        "outgoing_top_categories_by_value": frame_records(report.outgoing_top_categories_by_value),
+        "top_senders_by_amount": frame_records(report.top_senders_by_amount),
+        "top_recipients_by_amount": frame_records(report.top_recipients_by_amount),
+        "frequent_senders": frame_records(report.frequent_senders),
+        "frequent_recipients": frame_records(report.frequent_recipients),
+        "average_amount_by_recipient": frame_records(report.average_amount_by_recipient),
+        "anomalies": frame_records(report.anomalies),
+        "monthly_totals": monthly,
+    }
+
+
+class AnalysisServer(ThreadingHTTPServer):
+    """One thread per connection in front of a ProcessJobRunner"""
+    daemon_threads = True
+
+    def __init__(self, address, runner, quiet=False):
+        super().__init__(address, AnalysisRequestHandler)
+        self.runner = runner
+        self.quiet = quiet
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    server_version = "MpesaAnalysis/1.0"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload, headers=None):
+        self.send_body(status, json.dumps(payload).encode(), "application/json", headers)
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_file(self, path, content_type):
+        """Stream a file in chunks rather than reading it into memory"""
+        with open(path, "rb") as handle:
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(os.fstat(handle.fileno()).st_size))
+            self.end_headers()
+            shutil.copyfileobj(handle, self.wfile, STREAM_CHUNK_BYTES)
+
+    def send_error_json(self, status, message, headers=None):
+        self.send_json(status, {"error": message}, headers)
+
+    def job_status(self, key):
+        """Status document for a statement, or None if it is unknown"""
+        runner = self.server.runner
+        job = runner.get(key)
+        if job is None:
+            if get_statement(key) is None:
+                return None
+            status = {"statement_id": key, "status": DONE}
+        else:
+            status = {"statement_id": key, "status": job.status}
+            if job.status == QUEUED:
+                status["queue_position"] = runner.queue_position(key)
+            elif job.status == FAILED:
+                status["error"] = job.error
+        if status["status"] == DONE:
+            status["links"] = {
+                "transactions": f"/statements/{key}/transactions",
+                "report": f"/statements/{key}/report",
+                "report_pdf": f"/statements/{key}/report.pdf",
+            }
+        return status
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            runner = self.server.runner
+            self.send_json(HTTPStatus.OK, {
+                "status": "ok",
+                "workers": runner.workers,
+                "pending": runner.pending_count,
+                "max_pending": runner.max_pending,
+            })
+            return
+
+        match = STATEMENT_ROUTE.match(url.path)
+        if match is None:
+            self.send_error_json(HTTPStatus.NOT_FOUND, f"No route for {url.path}")
+            return
+        key, resource = match.group("key"), match.group("resource")
+
+        status = self.job_status(key)
+        if status is None:
+            self.send_error_json(HTTPStatus.NOT_FOUND, "Unknown statement")
+            return
+        if resource is None:
+            self.send_json(HTTPStatus.OK, status)
+            return
+        if status["status"] != DONE:
+            self.send_json(HTTPStatus.CONFLICT, status)
+            return
+
+        statement = get_statement(key)
+        if resource == "report.pdf":
+            try:
+                path = report_renderer.submit(key, statement).result()
+            except Exception as error:
+                self.send_error_json(HTTPStatus.INTERNAL_SERVER_ERROR,
+                                     f"The report could not be rendered: {type(error).__name__}: {error}")
+                return
+            self.send_file(path, "application/pdf")
+            return
+        if resource == "report":
+            report = report_cache.get_or_compute(key, statement)
+            self.send_json(HTTPStatus.OK, report_summary(report))
+            return
+
+        transactions = export_transactions(statement)
+        output_format = parse_qs(url.query).get("format", ["json"])[0]
+        if output_format == "arrow" or ARROW_CONTENT_TYPE in self.headers.get("Accept", ""):
+            self.send_body(HTTPStatus.OK, arrow_stream(transactions), ARROW_CONTENT_TYPE)
+        elif output_format == "json":
+            body = transactions.to_json(orient="records", date_format="iso").encode()
+            self.send_body(HTTPStatus.OK, body, "application/json")
+        else:
+            self.send_error_json(HTTPStatus.BAD_REQUEST, f"Unknown format {output_format!r}; use json or arrow")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip("/") != "/statements":
+            self.send_error_json(HTTPStatus.NOT_FOUND, f"No route for {url.path}")
+            return
+
+        length = self.headers.get("Content-Length")
+        if length is None:
+            self.send_error_json(HTTPStatus.LENGTH_REQUIRED, "The request needs a Content-Length header")
+            return
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.send_error_json(HTTPStatus.BAD_REQUEST, "Content-Length must be a non-negative integer")
+            return
+        if length > MAX_UPLOAD_BYTES:
+            self.send_error_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Statements are limited to {MAX_UPLOAD_BYTES:,} bytes")
+            return
+        file_bytes = self.rfile.read(length)
+        if not file_bytes.startswith(b"%PDF"):
+            self.send_error_json(HTTPStatus.BAD_REQUEST, "The request body must be a PDF statement")
+            return
+
+        try:
+            key = self.server.runner.submit(file_bytes)
+        except QueueFull as error:
+            self.send_error_json(HTTPStatus.SERVICE_UNAVAILABLE, str(error), {"Retry-After": str(RETRY_AFTER_SECONDS)})
+            return
+
+        try:
+            wait = min(float(parse_qs(url.query).get("wait", ["0"])[0]), MAX_WAIT_SECONDS)
+        except ValueError:
+            wait = 0
+        job = self.server.runner.get(key)
+        if wait > 0 and job is not None:
+            job.wait(wait)
+
+        status = self.job_status(key)
+        self.send_json(HTTPStatus.OK if status["status"] in (DONE, FAILED) else HTTPStatus.ACCEPTED, status,
+                       {"Location": f"/statements/{key}"})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("-w", "--workers", type=int, default=EXTRACTION_WORKERS, help="parsing processes (default: CPU count)")
+    parser.add_argument("--max-pending", type=int, default=None, help="statements queued or parsing before uploads get 503 (default: 4 per worker)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not log every request")
+    args = parser.parse_args(argv)
+
+    runner = ProcessJobRunner(workers=args.workers, max_pending=args.max_pending or 4 * args.workers)
+    server = AnalysisServer((args.host, args.port), runner, quiet=args.quiet)
+    host, port = server.server_address[:2]
+    print(f"Serving statement analysis on http://{host}:{port} with {args.workers} worker(s)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        runner.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""Process a directory of M-PESA statements without the Streamlit UI
+
+Every PDF is parsed and categorized in a process pool. The categorized
+transactions of all statements are written to one dataset, alongside a
+manifest with the status and timing of each file. Files that fail to parse
+are recorded in the manifest and skipped, as are files whose worker process
+dies while parsing them. With --anomalies the dataset gets
+the anomaly scores of every transaction, computed for all statements in one
+batched call.
+
+    python app/batch.py statements/ --output batch_output/ --workers 8 [--backend text] [--anomalies]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from anomalies import score_transactions
+from extraction import DEFAULT_BACKEND, EXTRACTION_BACKENDS, parse_statement
+from statement_cache import statement_hash
+
+
+def process_file(path, backend=DEFAULT_BACKEND):
+    """Worker: parse one statement; returns (manifest row, categorized frame or None)"""
+    start = time.perf_counter()
+    row = {"file": path, "status": "ok", "error": None, "statement_hash": None, "transactions": 0}
+    categorized = None
+    try:
+        with open(path, "rb") as handle:
+            file_bytes = handle.read()
+        row["statement_hash"] = statement_hash(file_bytes)
+        # One process per file already; keep page extraction inside it serial
+        statement = parse_statement(file_bytes, workers=1, backend=backend)
+        row["verification_code"] = statement.customer_info.get("statement_verification_code")
+        row["mobile_number"] = statement.customer_info.get("mobile_number")
+        categorized = statement.categorized_transactions()
+        if categorized.empty:
+            row["status"] = "empty"
+            categorized = None
+        else:
+            categorized.insert(0, "Source File", os.path.basename(path))
+            categorized.insert(1, "Statement Hash", row["statement_hash"])
+            row["transactions"] = len(categorized)
+    except Exception as error:
+        row["status"] = "failed"
+        row["error"] = f"{type(error).__name__}: {error}"
+    row["seconds"] = round(time.perf_counter() - start, 3)
+    return row, categorized
+
+
+def worker_died_row(path, error):
+    """Manifest row of a file whose worker process died while parsing it"""
+    return {"file": path, "status": "failed", "error": f"worker process died: {error}", "statement_hash": None,
+            "transactions": 0, "seconds": None}
+
+
+def find_statements(input_dir, pattern="*.pdf", recursive=False):
+    if recursive:
+        pattern = os.path.join("**", pattern)
+    return sorted(glob.glob(os.path.join(input_dir, pattern), recursive=recursive))
+
+
+def run_batch(paths, output_dir, workers=None, on_result=None, backend=DEFAULT_BACKEND, anomalies=False,
+              isolation_forest=False):
+    """Parse ``paths`` in parallel and write the dataset and manifest to ``output_dir``
+
+    With ``anomalies`` the dataset carries the columns of
+    anomalies.score_transactions, each statement scored against its own
+    history; ``isolation_forest`` adds the forest's scores.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = []
+    frames = []
+
+    def record(row, categorized):
+        manifest.append(row)
+        if categorized is not None:
+            frames.append(categorized)
+        if on_result is not None:
+            on_result(row)
+
+    # A worker that dies (e.g. a crash inside pdfminer) breaks every job still in the pool
+    broken = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_file, path, backend): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                record(*future.result())
+            except BrokenProcessPool:
+                broken.append(futures[future])
+
+    # Those are retried one at a time, so only a file that kills its worker again fails
+    executor = None
+    for path in sorted(broken):
+        executor = executor or ProcessPoolExecutor(max_workers=1)
+        try:
+            record(*executor.submit(process_file, path, backend).result())
+        except BrokenProcessPool as error:
+            executor.shutdown(wait=False)
+            executor = None
+            record(worker_died_row(path, error), None)
+    if executor is not None:
+        executor.shutdown()
+
+    manifest = pd.DataFrame(manifest).sort_values("file", ignore_index=True)
+    manifest.to_csv(os.path.join(output_dir, "manifest.csv"), index=False)
+
+    if frames:
+        dataset = pd.concat(frames, ignore_index=True).sort_values(["Source File"], kind="stable", ignore_index=True)
+        if anomalies or isolation_forest:
+            dataset = dataset.join(score_transactions(dataset, ["Statement Hash"], isolation_forest))
+        dataset.to_parquet(os.path.join(output_dir, "transactions.parquet"), index=False)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input_dir", help="directory containing statement PDFs")
+    parser.add_argument("-o", "--output", default="batch_output", help="directory for transactions.parquet and manifest.csv")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--pattern", default="*.pdf", help="file name pattern (default: *.pdf)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="also search subdirectories")
+    parser.add_argument("--backend", choices=EXTRACTION_BACKENDS, default=DEFAULT_BACKEND, help=f"table extraction backend (default: {DEFAULT_BACKEND})")
+    parser.add_argument("--anomalies", action="store_true", help="add anomaly scores to the dataset")
+    parser.add_argument("--isolation-forest", action="store_true", help="also score with an IsolationForest (implies --anomalies)")
+    args = parser.parse_args(argv)
+
+    paths = find_statements(args.input_dir, args.pattern, args.recursive)
+    if not paths:
+        print(f"No statements matching {args.pattern} in {args.input_dir}", file=sys.stderr)
+        return 1
+
+    def report(row):
+        detail = row["error"] if row["status"] == "failed" else f"{row['transactions']:,} transactions"
+        print(f"[{row['status']:>6}] {row['file']} ({row['seconds']:.2f}s) {detail}")
+
+    start = time.perf_counter()
+    manifest = run_batch(paths, args.output, args.workers, on_result=report, backend=args.backend,
+                         anomalies=args.anomalies, isolation_forest=args.isolation_forest)
+    counts = manifest["status"].value_counts()
+    print(
+        f"Processed {len(manifest):,} statements in {time.perf_counter() - start:.1f}s: "
+        + ", ".join(f"{count} {status}" for status, count in counts.items())
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
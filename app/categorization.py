@@ -0,0 +1,262 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from category_model import UNCATEGORIZED, category_model
+
+# Classification rules, first match wins; the CLASSIFICATION_RULES_FILE
+# environment variable points the app at another file
+CLASSIFICATION_RULES_FILE = os.environ.get(
+    "CLASSIFICATION_RULES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "classification_rules.json")
+)
+
+# Keys of a rule in the rules file and the table columns they become
+RULE_FIELDS = {"pattern": "Details Pattern", "category": "Category", "description": "Description"}
+
+
+def load_classification_table(path=CLASSIFICATION_RULES_FILE):
+    """(version, table) of a rules file
+
+    The file holds {"version": N, "rules": [{"pattern", "category",
+    "description"}, ...]}. The version returned is N followed by a digest of
+    the file, so edits that forget to bump N still count as a new version.
+    """
+    with open(path, "rb") as handle:
+        content = handle.read()
+    document = json.loads(content)
+    table = pd.DataFrame(document["rules"], columns=list(RULE_FIELDS)).rename(columns=RULE_FIELDS)
+    if table["Details Pattern"].isna().any() or table["Category"].isna().any():
+        raise ValueError(f"Every rule in {path} needs a pattern and a category")
+    return f"{document.get('version', 0)}.{hashlib.sha256(content).hexdigest()[:8]}", table
+
+
+def clean_details(details):
+    # Remove line breaks based on the space conditions
+    details = re.sub(r'(?<=\s)\n', '', details)  # Remove line breaks after spaces
+    details = re.sub(r'(?<!\s)\n', ' ', details)  # Add a space before line breaks without space
+
+    # Remove carriage returns
+    details = details.replace("\r", "")
+
+    # Convert to lowercase
+    details = details.lower()
+    
+    return details
+
+def clean_details_column(details):
+    """clean_details() for a whole Details column"""
+    return (
+        details.str.replace(r"(?<=\s)\n", "", regex=True)
+        .str.replace(r"(?<!\s)\n", " ", regex=True)
+        .str.replace("\r", "", regex=False)
+        .str.lower()
+    )
+
+
+class CategoryMatcher:
+    """All classification patterns compiled into a single regex, applied column-wide
+
+    A zero-width lookahead tries the alternation at every position of the text,
+    and the alternation lists patterns in table order, so the lowest table index
+    found anywhere in the text is the same first-match-wins row as a scan of the
+    table in order.
+
+    Every rule counts the rows it categorized, the distinct Details values
+    behind them and the time spent matching those values; a last slot counts
+    the text no rule matched. The counters start at zero when the rules load.
+    """
+
+    def __init__(self, table, version=None):
+        self.table = table.reset_index(drop=True)
+        self.version = version
+        self.loaded_at = datetime.now()
+        self.categories = list(self.table["Category"])
+        self.patterns = [pattern.lower() for pattern in self.table["Details Pattern"]]
+        self.priority = {}
+        for index, pattern in enumerate(self.patterns):
+            self.priority.setdefault(pattern, index)
+        alternation = "|".join(re.escape(pattern) for pattern in self.priority)
+        self.regex = re.compile(f"(?=({alternation}))")
+
+        self.no_match = len(self.categories)
+        self._lock = threading.Lock()
+        self.reset_counters()
+
+    def reset_counters(self):
+        with self._lock:
+            self.rows = np.zeros(self.no_match + 1, dtype=np.int64)
+            self.distinct = np.zeros(self.no_match + 1, dtype=np.int64)
+            self.seconds = np.zeros(self.no_match + 1)
+
+    def _rule(self, cleaned_details):
+        """Index of the rule that wins for one cleaned Details string, or no_match"""
+        best = self.no_match
+        for match in self.regex.finditer(cleaned_details):
+            index = self.priority[match.group(1)]
+            if index < best:
+                best = index
+                if best == 0:
+                    break
+        return best
+
+    def _category(self, rule, cleaned_details):
+        if rule == self.no_match:
+            return "Uncategorized"
+        category = self.categories[rule]
+        # Reclassification logic for "M-Kopa Payment"
+        if "paybill" in category.lower() and "m-kopa" in cleaned_details:
+            return "M-Kopa Payment"
+        return category
+
+    def _record(self, rules, rows, seconds):
+        with self._lock:
+            np.add.at(self.rows, rules, rows)
+            np.add.at(self.distinct, rules, 1)
+            np.add.at(self.seconds, rules, seconds)
+
+    def match(self, cleaned_details):
+        """Category for one cleaned (lowercased) Details string"""
+        start = time.perf_counter()
+        rule = self._rule(cleaned_details)
+        self._record([rule], [1], [time.perf_counter() - start])
+        return self._category(rule, cleaned_details)
+
+    def categorize(self, details):
+        """Categories for a whole Details column, matching each distinct value once"""
+        codes, uniques = pd.factorize(clean_details_column(details))
+        rules = np.empty(len(uniques), dtype=np.intp)
+        seconds = np.empty(len(uniques))
+        categories = []
+        clock = time.perf_counter
+        for position, value in enumerate(uniques):
+            start = clock()
+            rules[position] = rule = self._rule(value)
+            categories.append(self._category(rule, value))
+            seconds[position] = clock() - start
+        rows = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        self._record(rules, rows, seconds)
+        missing = int((codes < 0).sum())
+        if missing:
+            self._record([self.no_match], [missing], [0.0])
+
+        categories = np.array(categories + ["Uncategorized"], dtype=object)
+        # factorize marks missing values with -1, which picks the trailing "Uncategorized"
+        return pd.Series(categories[codes], index=details.index, name="Category")
+
+    def shadowed_by(self):
+        """For every rule, the earlier rule contained in its pattern, or None
+
+        Any text holding such a rule's pattern also holds the earlier one,
+        which wins first, so the rule can never categorize anything.
+        """
+        return [
+            next((earlier for earlier in range(index) if self.patterns[earlier] in pattern), None)
+            for index, pattern in enumerate(self.patterns)
+        ]
+
+    def rule_stats(self):
+        """One row per rule, then one for text no rule matched, with the counters"""
+        with self._lock:
+            rows, distinct, seconds = self.rows.copy(), self.distinct.copy(), self.seconds.copy()
+        patterns = list(self.table["Details Pattern"])
+        shadowing = [None if earlier is None else patterns[earlier] for earlier in self.shadowed_by()]
+        stats = pd.DataFrame({
+            "Rule": list(range(1, self.no_match + 1)) + [None],
+            "Details Pattern": patterns + ["(no rule matched)"],
+            "Category": self.categories + ["Uncategorized"],
+            "Rows": rows,
+            "Distinct Details": distinct,
+            "Match Time (ms)": seconds * 1000,
+            "Time per Details (µs)": np.divide(seconds * 1e6, distinct, out=np.zeros_like(seconds), where=distinct > 0),
+            "Shadowed By": shadowing + [None],
+        })
+        return stats.astype({"Rule": "Int64"})
+
+
+class ClassificationRules:
+    """The CategoryMatcher of a rules file, recompiled when the file's mtime changes
+
+    The file is stat'ed on each access and reread only after it changed. A
+    file that fails to load keeps the previous rules in place and leaves the
+    reason in ``error``; with no previous rules the error is raised.
+    """
+
+    def __init__(self, path=CLASSIFICATION_RULES_FILE):
+        self.path = path
+        self.error = None
+        self._mtime = None
+        self._matcher = None
+        self._lock = threading.Lock()
+
+    @property
+    def matcher(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as error:
+            if self._matcher is None:
+                raise
+            self.error = f"{type(error).__name__}: {error}"
+            return self._matcher
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._reload(mtime)
+        return self._matcher
+
+    def _reload(self, mtime):
+        try:
+            version, table = load_classification_table(self.path)
+            self._matcher = CategoryMatcher(table, version)
+            self.error = None
+        except (OSError, ValueError, KeyError) as error:
+            if self._matcher is None:
+                raise
+            self.error = f"{type(error).__name__}: {error}"
+        self._mtime = mtime
+
+    @property
+    def version(self):
+        return self.matcher.version
+
+
+classification_rules = ClassificationRules()
+
+
+def infer_category(details):
+    return classification_rules.matcher.match(clean_details(details))
+
+
+def fill_uncategorized(details, categories):
+    """``categories`` with the rows no rule matched categorized by the fallback model, if one is trained
+
+    Only those rows reach the model, in one batch.
+    """
+    model = category_model.model
+    uncategorized = categories == UNCATEGORIZED
+    if model is None or not uncategorized.any():
+        return categories
+    categories = categories.astype(object)
+    predicted = model.predict(clean_details_column(details[uncategorized].astype(object)),
+                              classification_rules.matcher.categories)
+    categories[uncategorized] = predicted.to_numpy()
+    return categories
+
+
+def categorize_details(details, fallback=True):
+    """Categories for a Details column: the classification rules, then the fallback model"""
+    categories = classification_rules.matcher.categorize(details)
+    return fill_uncategorized(details, categories) if fallback else categories
+
+
+def categories_version():
+    """Version of what categorize_details() gives: the rules', and the fallback model's if there is one"""
+    version = classification_rules.version
+    model = category_model.model
+    return version if model is None else f"{version}+{model.version}"
@@ -0,0 +1,248 @@
+"""Fallback classifier for the Details no classification rule matches
+
+A TF-IDF vectorizer and a logistic regression are trained on Details the
+classification rules did categorize: those of the statements in the
+statement store and, optionally, of batch.py datasets. When a column is
+categorized, only the distinct Details the rules left "Uncategorized" are
+scored, in one predict_proba call, and a prediction is kept when its
+probability reaches CATEGORY_MODEL_THRESHOLD.
+
+The trained model is one file. Every process loads it once, and again only
+after the file changed; without the file the rules work alone.
+
+    python app/category_model.py [--dataset batch_output/ ...] [--output category_model.pkl]
+"""
+import argparse
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# The trained model; the CATEGORY_MODEL_FILE environment variable points the app at another file
+CATEGORY_MODEL_FILE = os.environ.get(
+    "CATEGORY_MODEL_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "category_model.pkl")
+)
+
+# Probability from which a predicted category replaces "Uncategorized"
+CATEGORY_MODEL_THRESHOLD = 0.6
+
+# Share of the Details held out to report accuracy when training
+HOLDOUT_SHARE = 0.2
+
+UNCATEGORIZED = "Uncategorized"
+
+# Phone numbers, till and account numbers and their masking say nothing about the category
+NUMBERS_PATTERN = r"[\d*]+"
+
+
+def model_text(cleaned_details):
+    """The text the model sees: cleaned Details without numbers"""
+    return pd.Series(cleaned_details).str.replace(NUMBERS_PATTERN, " ", regex=True)
+
+
+class CategoryModel:
+    """A trained TF-IDF and logistic regression pipeline with the rules it learned from"""
+
+    def __init__(self, pipeline, version=None, rules_version=None, trained_at=None, samples=0):
+        self.pipeline = pipeline
+        self.version = version
+        self.rules_version = rules_version
+        self.trained_at = trained_at
+        self.samples = samples
+        self.rows = 0
+        self.filled = 0
+        self._lock = threading.Lock()
+
+    def predict(self, cleaned_details, categories=None):
+        """Categories for cleaned Details, "Uncategorized" where the model is not confident
+
+        Each distinct value is scored once, all in one predict_proba call.
+        Predictions outside ``categories`` (e.g. dropped from the rules since
+        training) are not used.
+        """
+        codes, uniques = pd.factorize(cleaned_details)
+        predicted = np.full(len(uniques) + 1, UNCATEGORIZED, dtype=object)
+        if len(uniques):
+            probabilities = self.pipeline.predict_proba(model_text(uniques))
+            best = probabilities.argmax(axis=1)
+            confident = probabilities[np.arange(len(best)), best] >= CATEGORY_MODEL_THRESHOLD
+            classes = self.pipeline.classes_[best]
+            if categories is not None:
+                confident &= np.isin(classes, list(categories))
+            predicted[:-1] = np.where(confident, classes, UNCATEGORIZED)
+        # factorize marks missing values with -1, which picks the trailing "Uncategorized"
+        result = pd.Series(predicted[codes], index=getattr(cleaned_details, "index", None), name="Category")
+        with self._lock:
+            self.rows += len(result)
+            self.filled += int((result != UNCATEGORIZED).sum())
+        return result
+
+
+def fit_model(details, labels):
+    """A CategoryModel pipeline fit on cleaned Details and their categories"""
+    # scikit-learn is only loaded once a model is trained or used
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+
+    pipeline = make_pipeline(
+        TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True),
+        LogisticRegression(max_iter=1000),
+    )
+    return pipeline.fit(model_text(details), np.asarray(labels))
+
+
+def save_model(model, path=CATEGORY_MODEL_FILE):
+    # The counters belong to the process; only the pipeline and where it came from are kept
+    state = {"pipeline": model.pipeline, "rules_version": model.rules_version,
+             "trained_at": model.trained_at, "samples": model.samples}
+    staging = f"{path}.{os.getpid()}.tmp"
+    with open(staging, "wb") as handle:
+        pickle.dump(state, handle)
+    os.replace(staging, path)
+
+
+def load_model(path=CATEGORY_MODEL_FILE):
+    """The CategoryModel in a file; its version is a digest of the file"""
+    with open(path, "rb") as handle:
+        content = handle.read()
+    return CategoryModel(version=hashlib.sha256(content).hexdigest()[:8], **pickle.loads(content))
+
+
+class CategoryModelFile:
+    """The CategoryModel of a model file, reloaded when the file's mtime changes
+
+    ``model`` is None while there is no file. A file that fails to load
+    keeps the previous model in place and leaves the reason in ``error``.
+    """
+
+    def __init__(self, path=CATEGORY_MODEL_FILE):
+        self.path = path
+        self.error = None
+        self._mtime = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            # A deleted model goes back to the rules alone
+            self._model = self._mtime = None
+            return None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._reload(mtime)
+        return self._model
+
+    def _reload(self, mtime):
+        try:
+            self._model = load_model(self.path)
+            self.error = None
+        except (OSError, pickle.UnpicklingError, AttributeError, EOFError, ImportError, TypeError) as error:
+            self.error = f"{type(error).__name__}: {error}"
+        self._mtime = mtime
+
+
+category_model = CategoryModelFile()
+
+
+def store_details(store):
+    """Distinct Details of every statement in a statement store"""
+    details = set()
+    for key in store.keys():
+        statement = store.load(key)
+        if statement is not None and "Details" in statement.transactions.columns:
+            details.update(statement.transactions["Details"].dropna().astype(str).unique())
+    return details
+
+
+def dataset_details(output_dir):
+    """Distinct Details of a batch.py dataset, read a batch of rows at a time"""
+    details = set()
+    dataset = pq.ParquetFile(os.path.join(output_dir, "transactions.parquet"), pre_buffer=False)
+    for batch in dataset.iter_batches(columns=["Details"]):
+        details.update(batch.column(0).drop_null().unique().to_pylist())
+    return details
+
+
+def training_set(details, matcher):
+    """(cleaned Details, categories) of the distinct Details the rules categorize"""
+    from categorization import clean_details_column
+
+    cleaned = pd.Series(sorted(set(clean_details_column(pd.Series(sorted(details), dtype=object)))), dtype=object)
+    labels = matcher.categorize(cleaned)
+    categorized = labels != UNCATEGORIZED
+    return cleaned[categorized].reset_index(drop=True), labels[categorized].reset_index(drop=True)
+
+
+def train_model(details, table, rules_version=None):
+    """(CategoryModel, hold-out accuracy, hold-out coverage) trained on raw Details
+
+    Labels come from a fresh matcher of the rules ``table``, so training
+    leaves the live rule counters alone. Accuracy and coverage are those of a
+    model fit without HOLDOUT_SHARE of the Details, scored on them at
+    CATEGORY_MODEL_THRESHOLD; the model returned is fit on all of them.
+    """
+    from categorization import CategoryMatcher
+
+    cleaned, labels = training_set(details, CategoryMatcher(table))
+    if labels.nunique() < 2:
+        raise ValueError("Training needs Details of at least two categories")
+
+    order = np.random.default_rng(0).permutation(len(cleaned))
+    held_out = order[:int(len(order) * HOLDOUT_SHARE)]
+    training = order[len(held_out):]
+    accuracy = coverage = None
+    if len(held_out) and labels.iloc[training].nunique() >= 2:
+        check = CategoryModel(fit_model(cleaned.iloc[training], labels.iloc[training]))
+        predicted = check.predict(cleaned.iloc[held_out])
+        kept = predicted != UNCATEGORIZED
+        coverage = kept.mean()
+        accuracy = (predicted[kept] == labels.iloc[held_out][kept]).mean() if kept.any() else None
+
+    model = CategoryModel(fit_model(cleaned, labels), rules_version=rules_version,
+                          trained_at=datetime.now(), samples=len(cleaned))
+    return model, accuracy, coverage
+
+
+def main():
+    from categorization import classification_rules
+    from statement_store import statement_store
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dataset", nargs="*", default=[], help="batch.py output directories to train on as well")
+    parser.add_argument("--no-store", action="store_true", help="leave the statement store out of the training data")
+    parser.add_argument("-o", "--output", default=CATEGORY_MODEL_FILE, help="where to write the model")
+    args = parser.parse_args()
+
+    details = set() if args.no_store else store_details(statement_store)
+    for output_dir in args.dataset:
+        details |= dataset_details(output_dir)
+    matcher = classification_rules.matcher
+    try:
+        model, accuracy, coverage = train_model(details, matcher.table, matcher.version)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+    save_model(model, args.output)
+
+    print(f"Trained on {model.samples:,} distinct Details in {len(model.pipeline.classes_)} categories "
+          f"(rules {matcher.version}), written to {args.output}")
+    if coverage is not None:
+        shown = "n/a" if accuracy is None else f"{accuracy:.1%}"
+        print(f"Held-out Details: {coverage:.1%} predicted at {CATEGORY_MODEL_THRESHOLD:.0%} confidence, "
+              f"{shown} of them correctly")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
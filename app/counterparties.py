@@ -0,0 +1,64 @@
+import pandas as pd
+
+# Columns added at ingest; stored as Categoricals sharing one dictionary per statement
+COUNTERPARTY_COLUMNS = ["Counterparty", "Counterparty Phone", "Counterparty Account"]
+
+# Either a masked phone number followed by the name, e.g.
+#   Customer Transfer to - 2547******977 JOEL NGARUNI
+# or a till/paybill/agent number followed by the business name, up to any account
+# number or API reference, e.g.
+#   Pay Bill Online to 510800 - iPay Ltd Acc. G900
+#   Business Payment from 501901 - KCB 1 via API. Original conversation ID is ...
+COUNTERPARTY_PATTERN = (
+    r"(?P<phone>\d{2,4}\*{3,}\d{3})\s+(?P<phone_name>\S.*)"
+    r"|(?i:to|from|till)\s+(?P<account>\d{5,7})\s*-\s*"
+    r"(?P<account_name>.+?)(?:\.?\s+(?:Acc\.|via\b|Original\b).*)?\.?$"
+)
+
+
+def extract_counterparties(details):
+    """Counterparty name, masked phone and till/paybill number for each Details value
+
+    One vectorized ``str.extract`` pass. Names are whitespace-collapsed and
+    title-cased; phone numbers are normalized to the local 07... form so the
+    same contact matches whichever prefix the statement printed. Values that
+    do not apply are missing.
+    """
+    details = details.astype("string").str.replace(r"\s+", " ", regex=True).str.strip()
+    parts = details.str.extract(COUNTERPARTY_PATTERN)
+
+    names = parts["phone_name"].fillna(parts["account_name"]).str.strip().str.title()
+    phones = parts["phone"].str.replace(r"^254", "0", regex=True)
+    return pd.DataFrame({
+        "Counterparty": names.astype(object),
+        "Counterparty Phone": phones.astype(object),
+        "Counterparty Account": parts["account"].astype(object),
+    }, index=details.index)
+
+
+def add_counterparties(transactions):
+    """Add the COUNTERPARTY_COLUMNS to a frame with a Details column, in place"""
+    counterparties = extract_counterparties(transactions["Details"])
+    for column in COUNTERPARTY_COLUMNS:
+        transactions[column] = counterparties[column]
+    return transactions
+
+
+def intern_counterparties(*frames):
+    """Convert the counterparty columns of ``frames`` to Categoricals, in place
+
+    The frames share one dictionary per column, so counterparties compare
+    and group by the same integer codes across the full, incoming and
+    outgoing views of a statement.
+    """
+    frames = [frame for frame in frames if frame is not None]
+    for column in COUNTERPARTY_COLUMNS:
+        present = [frame[column] for frame in frames if column in frame.columns]
+        if not present:
+            continue
+        values = pd.concat(present).dropna().unique()
+        dtype = pd.CategoricalDtype(sorted(values))
+        for frame in frames:
+            if column in frame.columns:
+                frame[column] = frame[column].astype(dtype)
+    return frames
@@ -0,0 +1,285 @@
+"""Per-customer credit-scoring features for a portfolio of categorized statements
+
+Transactions are read in chunks, from the dataset batch.py writes or from
+the statement store, and every chunk is reduced by one groupby pass to
+additive per-customer sums: money in and out, income, Fuliza borrowing and
+repayment, charges, M-Shwari flows and balance moments, plus income per
+customer and month and amounts per customer and counterparty. Only those
+sums are carried from chunk to chunk, so memory is bounded by the number of
+customers and counterparties, not by the number of statements. The features
+are derived from the sums once all chunks are in, one row per customer:
+
+    Income Regularity        1 / (1 + coefficient of variation of monthly income)
+    Income Months Share      share of months with any income
+    Fuliza Ratio             Fuliza overdraft drawn over income
+    Fuliza Repayment Ratio   Fuliza repaid over Fuliza drawn
+    Charges Share            transaction charges over money out
+    M-Shwari Savings Rate    net M-Shwari deposits over income
+    Balance Volatility       coefficient of variation of the running balance
+    Sender / Recipient Concentration   Herfindahl index of amounts by counterparty
+
+Months run from a customer's first to last transaction. Customers are keyed
+by the statement's mobile number, or its hash when the header has none.
+Statements of one customer that overlap in time are counted twice.
+
+    python app/credit_features.py batch_output/ -o features.csv
+    python app/credit_features.py --store [STORE_DIR] -o features.parquet
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from statement_store import StatementStore, statement_store
+
+# Rows per chunk read from a batch dataset
+CHUNK_ROWS = 250_000
+
+# Statements per chunk read from the statement store
+STATEMENTS_PER_CHUNK = 200
+
+# Money in that is not income: overdraft drawn, own savings withdrawn, reversals
+NON_INCOME_CATEGORIES = ["Fuliza Money In", "M-Shwari Withdrawal", "Reversal Money In"]
+FULIZA_DRAWN_CATEGORIES = ["Fuliza Money In"]
+FULIZA_REPAID_CATEGORIES = ["Fuliza Deduction"]
+SAVINGS_DEPOSIT_CATEGORIES = ["M-Shwari Deposit", "Deposit to M-Shwari Locked Savings"]
+SAVINGS_WITHDRAWAL_CATEGORIES = ["M-Shwari Withdrawal"]
+CHARGES_PREFIX = "Charges"
+
+# Transaction columns the pipeline reads
+INPUT_COLUMNS = ["Statement Hash", "Completion Time", "Category", "Paid In", "Withdrawn", "Balance", "Counterparty"]
+
+# How each per-customer sum combines across chunks
+TOTALS_AGGREGATIONS = {
+    "Transactions": "sum",
+    "Money In": "sum",
+    "Money Out": "sum",
+    "Income": "sum",
+    "Fuliza Drawn": "sum",
+    "Fuliza Repaid": "sum",
+    "Charges": "sum",
+    "Savings Deposits": "sum",
+    "Savings Withdrawals": "sum",
+    "Balance Count": "sum",
+    "Balance Sum": "sum",
+    "Balance Squares": "sum",
+    "First Transaction": "min",
+    "Last Transaction": "max",
+}
+
+FEATURE_COLUMNS = [
+    "Statements", "Transactions", "First Transaction", "Last Transaction", "Months",
+    "Average Monthly Income", "Income Regularity", "Income Months Share",
+    "Fuliza Ratio", "Fuliza Repayment Ratio", "Charges Share", "M-Shwari Savings Rate",
+    "Balance Volatility", "Sender Concentration", "Recipient Concentration",
+]
+
+
+def category_mask(category, predicate):
+    """Rows whose category satisfies ``predicate``, evaluated once per distinct category"""
+    if not isinstance(category.dtype, pd.CategoricalDtype):
+        category = category.astype("category")
+    matches = np.array([predicate(str(value)) for value in category.cat.categories] + [False], dtype=bool)
+    # Code -1 (missing) picks the trailing False
+    return matches[category.cat.codes.to_numpy()]
+
+
+def ratio(numerator, denominator):
+    """numerator / denominator, NaN where the denominator is not positive"""
+    return numerator / denominator.where(denominator > 0)
+
+
+def herfindahl(amounts):
+    """Herfindahl index per leading index levels of amounts keyed by (..., counterparty)"""
+    levels = list(range(amounts.index.nlevels - 1))
+    shares = amounts / amounts.groupby(level=levels).transform("sum")
+    return (shares ** 2).groupby(level=levels).sum()
+
+
+class FeatureAccumulator:
+    """Per-customer sums over chunks of categorized transactions
+
+    add() takes a chunk in shillings with a Customer column and the
+    INPUT_COLUMNS; features() derives the feature table from the sums.
+    """
+
+    def __init__(self):
+        self.totals = None
+        self.monthly_income = None
+        self.counterparty_amounts = None
+        self.statements = set()
+
+    def add(self, chunk):
+        if chunk.empty:
+            return
+        customer = chunk["Customer"]
+        category = chunk["Category"]
+        times = chunk["Completion Time"]
+        paid_in = chunk["Paid In"].astype("float64").abs().fillna(0).to_numpy()
+        withdrawn = chunk["Withdrawn"].astype("float64").abs().fillna(0).to_numpy()
+        balance = chunk["Balance"].astype("float64")
+        income = np.where(category.isin(NON_INCOME_CATEGORIES).to_numpy(), 0, paid_in)
+
+        rows = pd.DataFrame({
+            "Customer": customer.to_numpy(),
+            "Transactions": 1,
+            "Money In": paid_in,
+            "Money Out": withdrawn,
+            "Income": income,
+            "Fuliza Drawn": np.where(category.isin(FULIZA_DRAWN_CATEGORIES).to_numpy(), paid_in, 0),
+            "Fuliza Repaid": np.where(category.isin(FULIZA_REPAID_CATEGORIES).to_numpy(), withdrawn, 0),
+            "Charges": np.where(category_mask(category, lambda name: name.startswith(CHARGES_PREFIX)), withdrawn, 0),
+            "Savings Deposits": np.where(category.isin(SAVINGS_DEPOSIT_CATEGORIES).to_numpy(), withdrawn, 0),
+            "Savings Withdrawals": np.where(category.isin(SAVINGS_WITHDRAWAL_CATEGORIES).to_numpy(), paid_in, 0),
+            "Balance Count": balance.notna().to_numpy(),
+            "Balance Sum": balance.fillna(0).to_numpy(),
+            "Balance Squares": balance.fillna(0).to_numpy() ** 2,
+            "First Transaction": times.to_numpy(),
+            "Last Transaction": times.to_numpy(),
+        })
+        # One groupby pass for every per-customer sum
+        self.totals = self._combine(self.totals, rows.groupby("Customer").agg(TOTALS_AGGREGATIONS), TOTALS_AGGREGATIONS)
+
+        month = times.dt.year * 12 + times.dt.month - 1
+        earning = income > 0
+        monthly = pd.Series(income[earning]).groupby(
+            [customer.to_numpy()[earning], month.to_numpy()[earning]]
+        ).sum().rename_axis(["Customer", "Month"])
+        self.monthly_income = self._combine(self.monthly_income, monthly)
+
+        counterparty = chunk["Counterparty"]
+        named = counterparty.notna().to_numpy()
+        amounts = pd.Series(np.where(paid_in > 0, paid_in, withdrawn)[named]).groupby([
+            customer.to_numpy()[named],
+            np.where(paid_in > 0, "Sender", "Recipient")[named],
+            counterparty.astype(object).to_numpy()[named],
+        ]).sum().rename_axis(["Customer", "Direction", "Counterparty"])
+        self.counterparty_amounts = self._combine(self.counterparty_amounts, amounts)
+
+        self.statements.update(zip(customer, chunk["Statement Hash"]))
+
+    @staticmethod
+    def _combine(running, partial, aggregations="sum"):
+        if running is None:
+            return partial
+        levels = list(range(partial.index.nlevels))
+        return pd.concat([running, partial]).groupby(level=levels).agg(aggregations)
+
+    def features(self):
+        """One row per customer with the FEATURE_COLUMNS"""
+        if self.totals is None:
+            return pd.DataFrame(columns=FEATURE_COLUMNS).rename_axis("Customer")
+        totals = self.totals
+        first, last = totals["First Transaction"], totals["Last Transaction"]
+        months = ((last.dt.year - first.dt.year) * 12 + last.dt.month - first.dt.month + 1).fillna(1).clip(lower=1)
+
+        monthly = self.monthly_income
+        income_squares = (monthly ** 2).groupby(level="Customer").sum().reindex(totals.index, fill_value=0)
+        income_months = monthly.groupby(level="Customer").size().reindex(totals.index, fill_value=0)
+        mean_income = totals["Income"] / months
+        income_std = np.sqrt((income_squares / months - mean_income ** 2).clip(lower=0))
+
+        balance_mean = ratio(totals["Balance Sum"], totals["Balance Count"])
+        balance_std = np.sqrt((ratio(totals["Balance Squares"], totals["Balance Count"]) - balance_mean ** 2).clip(lower=0))
+
+        concentration = herfindahl(self.counterparty_amounts).unstack("Direction").reindex(
+            index=totals.index, columns=["Sender", "Recipient"]
+        )
+        statements = pd.Series([customer for customer, _ in self.statements]).value_counts()
+
+        features = pd.DataFrame({
+            "Statements": statements.reindex(totals.index, fill_value=0),
+            "Transactions": totals["Transactions"],
+            "First Transaction": first,
+            "Last Transaction": last,
+            "Months": months,
+            "Average Monthly Income": mean_income,
+            "Income Regularity": (1 / (1 + ratio(income_std, mean_income))).fillna(0),
+            "Income Months Share": income_months / months,
+            "Fuliza Ratio": ratio(totals["Fuliza Drawn"], totals["Income"]),
+            "Fuliza Repayment Ratio": ratio(totals["Fuliza Repaid"], totals["Fuliza Drawn"]),
+            "Charges Share": ratio(totals["Charges"], totals["Money Out"]),
+            "M-Shwari Savings Rate": ratio(totals["Savings Deposits"] - totals["Savings Withdrawals"], totals["Income"]),
+            "Balance Volatility": ratio(balance_std, balance_mean),
+            "Sender Concentration": concentration["Sender"],
+            "Recipient Concentration": concentration["Recipient"],
+        })
+        return features.rename_axis("Customer")
+
+
+def dataset_chunks(output_dir, chunk_rows=CHUNK_ROWS):
+    """Chunks of the transactions.parquet batch.py wrote, customers taken from its manifest"""
+    manifest = pd.read_csv(os.path.join(output_dir, "manifest.csv"), dtype={"statement_hash": str, "mobile_number": str})
+    customers = {}
+    if "mobile_number" in manifest.columns:
+        known = manifest.dropna(subset=["statement_hash", "mobile_number"])
+        customers = dict(zip(known["statement_hash"], known["mobile_number"]))
+
+    # Pre-buffered reads keep Arrow memory growing from batch to batch
+    dataset = pq.ParquetFile(os.path.join(output_dir, "transactions.parquet"), pre_buffer=False)
+    columns = [column for column in INPUT_COLUMNS if column in dataset.schema_arrow.names]
+    for batch in dataset.iter_batches(batch_size=chunk_rows, columns=columns):
+        chunk = batch.to_pandas().reindex(columns=INPUT_COLUMNS)
+        hashes = chunk["Statement Hash"]
+        chunk["Customer"] = hashes.map(customers).fillna(hashes)
+        yield chunk
+
+
+def store_chunks(store=statement_store, statements_per_chunk=STATEMENTS_PER_CHUNK):
+    """Chunks of the statements in a StatementStore, loaded ``statements_per_chunk`` at a time"""
+    frames = []
+    for key in store.keys():
+        statement = store.load(key)
+        frame = statement.categorized_transactions().reindex(columns=INPUT_COLUMNS)
+        frame["Statement Hash"] = key
+        frame["Customer"] = statement.customer_info.get("mobile_number") or key
+        frames.append(frame)
+        if len(frames) >= statements_per_chunk:
+            yield pd.concat(frames, ignore_index=True)
+            frames = []
+    if frames:
+        yield pd.concat(frames, ignore_index=True)
+
+
+def customer_features(chunks, on_chunk=None):
+    """The feature table of an iterable of transaction chunks"""
+    accumulator = FeatureAccumulator()
+    for number, chunk in enumerate(chunks, 1):
+        accumulator.add(chunk)
+        if on_chunk is not None:
+            on_chunk(number, len(chunk))
+    return accumulator.features()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("batch_output", nargs="?", help="directory written by batch.py")
+    parser.add_argument("--store", nargs="?", const=True, default=None, help="read the statement store (optionally at this directory) instead")
+    parser.add_argument("-o", "--output", default="features.csv", help="feature table, .csv or .parquet (default: features.csv)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help=f"rows per chunk of a batch dataset (default: {CHUNK_ROWS:,})")
+    args = parser.parse_args(argv)
+
+    if args.store is not None:
+        store = statement_store if args.store is True else StatementStore(args.store)
+        chunks = store_chunks(store)
+    elif args.batch_output:
+        chunks = dataset_chunks(args.batch_output, args.chunk_rows)
+    else:
+        parser.error("give a batch output directory or --store")
+
+    start = time.perf_counter()
+    features = customer_features(chunks, on_chunk=lambda number, rows: print(f"chunk {number:,}: {rows:,} transactions"))
+    if args.output.endswith(".parquet"):
+        features.to_parquet(args.output)
+    else:
+        features.to_csv(args.output)
+    print(f"{len(features):,} customers in {time.perf_counter() - start:.1f}s -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
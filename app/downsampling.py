@@ -0,0 +1,86 @@
+"""Reduce long time series to a fixed point budget before they are plotted
+
+Charts of every transaction in a multi-year statement ship megabytes of
+points to the browser. The series are downsampled here with
+Largest-Triangle-Three-Buckets (LTTB), which keeps the peaks and troughs
+that matter visually, so each chart sends at most a fixed number of points
+whatever the statement size. Zooming into a range downsamples only that
+range, which brings back the finer detail.
+"""
+import numpy as np
+import pandas as pd
+
+# Most points a single chart sends to the browser
+MAX_CHART_POINTS = 2000
+
+# Traces with more points than this are drawn with WebGL (go.Scattergl)
+WEBGL_MIN_POINTS = 1000
+
+
+def lttb_indices(x, y, max_points):
+    """Positions of the points LTTB keeps out of ``x`` and ``y``
+
+    ``x`` must be sorted. The first and last points are always kept; every
+    bucket in between contributes the point forming the largest triangle with
+    the point kept from the previous bucket and the mean of the next bucket.
+    """
+    count = len(x)
+    if count <= max_points or max_points < 3:
+        return np.arange(count)
+
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    # Bucket edges over the inner points; bucket i spans edges[i]:edges[i + 1]
+    edges = np.linspace(1, count - 1, max_points - 1).astype(int)
+
+    kept = np.empty(max_points, dtype=int)
+    kept[0], kept[-1] = 0, count - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_stop = edges[bucket + 1], edges[bucket + 2]
+            next_x, next_y = x[next_start:next_stop].mean(), y[next_start:next_stop].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        # Twice the triangle area for every candidate in this bucket
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def downsample(frame, x_column, y_columns, max_points=MAX_CHART_POINTS, start=None, end=None):
+    """Rows of ``frame`` to plot ``y_columns`` against ``x_column`` within budget
+
+    ``frame`` must be sorted by ``x_column``. Rows outside ``start``/``end``
+    (inclusive) and rows without an x value are dropped first. Each y column
+    is downsampled over its own non-missing values to an equal share of
+    ``max_points`` and the kept rows are combined. Frames already within
+    budget are returned unchanged.
+    """
+    frame = frame[frame[x_column].notna()]
+    if start is not None:
+        frame = frame[frame[x_column] >= start]
+    if end is not None:
+        frame = frame[frame[x_column] <= end]
+    if len(frame) <= max_points:
+        return frame
+
+    x = frame[x_column]
+    if pd.api.types.is_datetime64_any_dtype(x):
+        x = x.astype("int64")
+    x = x.to_numpy(dtype="float64")
+
+    kept = []
+    points_per_series = max(max_points // len(y_columns), 3)
+    for column in y_columns:
+        y = frame[column].to_numpy(dtype="float64", na_value=np.nan)
+        present = np.flatnonzero(~np.isnan(y))
+        kept.append(present[lttb_indices(x[present], y[present], points_per_series)])
+    return frame.iloc[np.unique(np.concatenate(kept))]
+
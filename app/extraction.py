@@ -0,0 +1,559 @@
+import io
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pdfplumber
+
+from categorization import categories_version, categorize_details, fill_uncategorized
+from counterparties import add_counterparties, intern_counterparties
+from text_layer import ColumnLayout
+
+# Number of worker processes used for parallel table extraction
+EXTRACTION_WORKERS = os.cpu_count() or 1
+
+# Timestamp layout of the Completion Time column, e.g. 2024-11-16 21:29:54
+COMPLETION_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Columns derived from Completion Time at ingest
+TIME_DIMENSIONS = ["Hour", "Day of Week", "Month", "Year", "Half Year"]
+
+# Table extraction backends: pdfplumber's extract_tables() on every page, or
+# the text layer read against column boundaries learned from one page
+EXTRACTION_BACKENDS = ("tables", "text")
+DEFAULT_BACKEND = "tables"
+
+# Statements shorter than this are extracted serially; process startup costs more than it saves
+PARALLEL_MIN_PAGES = 3
+
+# Process pools start workers by spawning: the Streamlit and API server processes are multi-threaded
+SPAWN_CONTEXT = multiprocessing.get_context("spawn")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# Amount columns; the statement frame holds them as nullable Int64 cents
+AMOUNT_COLUMNS = ["Paid In", "Withdrawn", "Balance"]
+
+# Repetitive text columns held as Categoricals in the statement frame
+CATEGORICAL_COLUMNS = ["Details", "Transaction Status", "Category"]
+
+# Receipt numbers are short fixed-length codes; Arrow strings keep them in one buffer
+RECEIPT_DTYPE = "string[pyarrow]"
+
+# Columns left out of the incoming and outgoing views
+INCOMING_DROPPED_COLUMNS = ["Balance", "Withdrawn"]
+OUTGOING_DROPPED_COLUMNS = ["Balance", "Paid In", "Transaction Status"]
+
+
+@dataclass
+class ParsedStatement:
+    """Everything the app needs from one uploaded M-PESA statement
+
+    ``transactions`` is the one frame kept per statement, in a compact layout
+    (see compact_transactions) with the Category of every row. The shilling
+    frames the pages work with are derived from it on access and are not
+    stored, so holding a statement costs a single frame. ``cube`` optionally
+    carries a RollupCube of the transactions kept up to date by whoever
+    assembled them (a Ledger); reports build one when it is None.
+    ``rules_version`` is the version of the classification rules, and of the
+    fallback category model, the categories came from. ``report_bases``
+    lists (report key, rows) of earlier states of the transactions that the
+    later rows only append to, oldest first; a cached report of one is
+    extended instead of being computed again.
+    """
+    summary_table: pd.DataFrame = None
+    customer_info: dict = field(default_factory=dict)
+    transactions: pd.DataFrame = field(default_factory=pd.DataFrame)
+    cube: object = None
+    rules_version: str = None
+    report_bases: tuple = ()
+
+    def _mask(self, column):
+        if column not in self.transactions.columns:
+            return pd.Series(False, index=self.transactions.index)
+        return self.transactions[column].notna()
+
+    @property
+    def incoming_mask(self):
+        return self._mask("Paid In")
+
+    @property
+    def outgoing_mask(self):
+        return self._mask("Withdrawn")
+
+    @property
+    def transaction_data(self):
+        """All transactions in shillings, without Category"""
+        return in_shillings(self.transactions.drop(columns=["Category"], errors="ignore"))
+
+    @property
+    def incoming_transactions(self):
+        """Rows with a Paid In amount, in shillings"""
+        incoming = self.transactions[self.incoming_mask]
+        return in_shillings(incoming.drop(columns=INCOMING_DROPPED_COLUMNS, errors="ignore"))
+
+    @property
+    def outgoing_transactions(self):
+        """Rows with a Withdrawn amount, in shillings"""
+        outgoing = self.transactions[self.outgoing_mask]
+        return in_shillings(outgoing.drop(columns=OUTGOING_DROPPED_COLUMNS, errors="ignore"))
+
+    def categorized_transactions(self):
+        """All transactions in shillings, with their Category"""
+        return in_shillings(self.transactions)
+
+    def memory_usage(self):
+        """Approximate size in bytes of the frames held by this statement"""
+        return sum(
+            int(frame.memory_usage(index=True, deep=True).sum())
+            for frame in (self.summary_table, self.transactions)
+            if frame is not None
+        )
+
+
+def parse_customer_info(first_page_text):
+    """Extract the customer header fields from the text of the first page"""
+    customer_info = {
+        "customer_name": None,
+        "mobile_number": None,
+        "email_address": None,
+        "statement_period": None,
+        "request_date": None,
+    }
+    if not first_page_text:
+        return customer_info
+
+    # Extract customer information using regex patterns
+    name_pattern = r"Customer Name:\s*([A-Za-z\s]+)"
+    mobile_pattern = r"Mobile Number:\s*(\d{10})"
+    email_pattern = r"Email Address:\s*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})"
+    period_pattern = r"Statement Period:\s*(\d{1,2}\s\w+\s\d{4})\s*-\s*(\d{1,2}\s\w+\s\d{4})"
+    date_pattern = r"Request Date:\s*(\d{1,2}\s\w+\s\d{4})"
+
+    name_match = re.search(name_pattern, first_page_text)
+    if name_match:
+        customer_info["customer_name"] = name_match.group(1).title().replace("Null", "").replace("Mobile Number", "").strip()
+
+    mobile_match = re.search(mobile_pattern, first_page_text)
+    if mobile_match:
+        customer_info["mobile_number"] = "+254" + mobile_match.group(1)[1:]
+
+    email_match = re.search(email_pattern, first_page_text)
+    if email_match:
+        customer_info["email_address"] = email_match.group(1).lower()
+
+    period_match = re.search(period_pattern, first_page_text)
+    if period_match:
+        start_date = period_match.group(1)
+        end_date = period_match.group(2)
+        customer_info["statement_period"] = f"{start_date} - {end_date}"
+
+    date_match = re.search(date_pattern, first_page_text)
+    if date_match:
+        customer_info["request_date"] = date_match.group(1)
+
+    return customer_info
+
+
+def statement_age(request_date):
+    """Days between the statement request date and today"""
+    if not request_date:
+        return None
+    try:
+        # Parse the request_date string into a datetime object
+        request_date_obj = datetime.strptime(request_date, "%d %b %Y")
+    except ValueError:
+        return "Invalid Request Date Format"
+    # Calculate the difference between the current date and the request date
+    return (datetime.now() - request_date_obj).days
+
+
+def parse_verification_code(last_page_text):
+    """Find the Statement Verification Code printed on the last page"""
+    if not last_page_text:
+        return None
+    # Search for "Statement Verification Code" and capture the next line
+    match = re.search(r"Statement Verification Code[\s\S]*?([A-Z0-9]{8})", last_page_text)
+    if match:
+        return match.group(1)
+    return None
+
+
+def safe_convert_to_float(x):
+    if pd.notna(x) and str(x) != "":
+        try:
+            return float(str(x).replace(",", "").replace("Ksh ", ""))
+        except ValueError:
+            return np.nan
+    else:
+        return np.nan
+
+
+def parse_amounts(values, as_cents=False):
+    """Vectorized safe_convert_to_float for a whole amount column
+
+    Strips "Ksh " and thousands separators column-wide and casts to float64,
+    falling back to pd.to_numeric(errors="coerce") when some cell is malformed.
+    Cells to_numeric rejects but float() accepts go through
+    safe_convert_to_float, so NaNs land exactly where they did before. With
+    ``as_cents`` the result is nullable Int64 cents, whose sums are exact.
+    """
+    cleaned = values.astype("str").str.replace(",", "", regex=False).str.replace("Ksh ", "", regex=False)
+    try:
+        # Well-formed statements take a straight typed cast
+        amounts = cleaned.mask(cleaned == "").astype("float64")
+    except (TypeError, ValueError):
+        amounts = pd.to_numeric(cleaned, errors="coerce").astype("float64")
+        retry = amounts.isna() & values.notna() & (cleaned != "") & (cleaned.str.strip().str.lower() != "nan")
+        if retry.any():
+            amounts[retry] = values[retry].map(safe_convert_to_float)
+
+    if as_cents:
+        return amounts_to_cents(amounts)
+    return amounts
+
+
+def amounts_to_cents(amounts):
+    """Float shillings to nullable Int64 cents; non-finite amounts become missing"""
+    amounts = amounts.where(np.isfinite(amounts))
+    return (amounts * 100).round().astype("Int64")
+
+
+def cents_to_amounts(cents):
+    """Nullable Int64 cents back to float64 shillings, missing as NaN"""
+    return cents.astype("float64") / 100
+
+
+def in_shillings(transactions):
+    """A copy of ``transactions`` with the AMOUNT_COLUMNS converted from cents"""
+    return transactions.assign(**{
+        column: cents_to_amounts(transactions[column])
+        for column in AMOUNT_COLUMNS
+        if column in transactions.columns
+    })
+
+
+class TransactionRowBuilder:
+    """Collects raw table rows from every page and builds the transaction frame once
+
+    Rows are appended to one columnar segment per distinct header, so a statement
+    ends up as a single segment no matter how many pages it has.
+    """
+
+    def __init__(self):
+        self._segments = {}
+
+    def add_table(self, table):
+        """Append the rows of one extracted table (header row first)"""
+        # Ensure the last column is 'Balance'
+        header = tuple(table[0][:-1]) + ("Balance",)
+        columns = self._segments.get(header)
+        if columns is None:
+            columns = self._segments[header] = [[] for _ in header]
+        for row in table[1:]:
+            if len(row) != len(header):
+                raise ValueError(f"{len(header)} columns passed, passed data had {len(row)} columns")
+            for column, value in zip(columns, row):
+                column.append(value)
+
+    @property
+    def row_count(self):
+        return sum(len(columns[0]) for columns in self._segments.values() if columns)
+
+    def build(self):
+        """Build the DataFrame, dropping rows with missing cells in one pass per segment"""
+        frames = []
+        for header, columns in self._segments.items():
+            # Build positionally so repeated or blank header cells keep their own column
+            frame = pd.DataFrame(dict(enumerate(columns)))
+            frame.columns = list(header)
+            frames.append(frame.dropna(how="any"))
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+
+def extract_page_tables(page, page_num, layout=None):
+    """Tables of one page, read from the text layer when a ColumnLayout is given
+
+    The first page carries the summary table and always goes through
+    extract_tables(), as does any page the text layer cannot read cleanly.
+    """
+    if layout is not None and page_num > 0:
+        tables = layout.extract_tables(page)
+        if tables is not None:
+            return tables
+    return page.extract_tables()
+
+
+def read_page(page, page_num, page_count, layout=None):
+    """(tables, text) of one page, then release the page's parsed layout
+
+    Text is only extracted from the first page (customer info) and the last
+    page (verification code); it is None for every other page. pdfplumber
+    keeps each page's layout objects until the PDF is closed, so closing the
+    page here keeps memory flat however long the statement is.
+    """
+    try:
+        text = page.extract_text() if page_num in (0, page_count - 1) else None
+        return extract_page_tables(page, page_num, layout), text
+    finally:
+        page.close()
+
+
+def extract_page_range(path, start, stop, layout=None):
+    """Worker: reopen the PDF by path and read pages [start, stop)"""
+    with pdfplumber.open(path) as pdf:
+        page_count = len(pdf.pages)
+        return start, [read_page(pdf.pages[page_num], page_num, page_count, layout) for page_num in range(start, stop)]
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Sized once to EXTRACTION_WORKERS; a parse wanting fewer processes keeps fewer shards in flight
+            _executor = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=SPAWN_CONTEXT)
+        return _executor
+
+
+def _discard_executor(executor):
+    """Drop a broken pool so the next parse starts a fresh one"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _iter_shards(executor, path, first_page, page_count, workers, layout):
+    # A few shards per worker keeps the pool busy when pages differ in cost
+    shard_size = max(1, -(-(page_count - first_page) // (workers * 4)))
+    shards = iter(range(first_page, page_count, shard_size))
+    futures = deque()
+
+    def submit_next():
+        start = next(shards, None)
+        if start is not None:
+            futures.append(executor.submit(extract_page_range, path, start, min(start + shard_size, page_count), layout))
+
+    for _ in range(workers):
+        submit_next()
+    try:
+        while futures:
+            _, shard = futures.popleft().result()
+            submit_next()
+            yield from shard
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def iter_pages_parallel(path, page_count, workers=None, layout=None):
+    """Read every page, sharding page ranges across worker processes
+
+    Yields one (tables, text) pair per page, as read_page() returns them, in
+    page order as soon as each shard is done. At most ``workers`` shards are
+    in flight at once, so a parse uses no more processes than it asked for.
+    If a worker dies, the pool is replaced and the pages not yet read are
+    retried once on the new one.
+    """
+    workers = max(1, min(workers or EXTRACTION_WORKERS, EXTRACTION_WORKERS, page_count))
+    next_page = 0
+    for attempt in range(2):
+        executor = _get_executor()
+        try:
+            for page in _iter_shards(executor, path, next_page, page_count, workers, layout):
+                yield page
+                next_page += 1
+            return
+        except BrokenProcessPool:
+            _discard_executor(executor)
+            if attempt:
+                raise
+
+
+def add_time_dimensions(transactions):
+    """Parse Completion Time once and derive the time columns every report reads
+
+    Adds Hour, Day of Week (0 = Monday), Month (monthly Period), Year and
+    Half Year (1 or 2) as compact nullable integers; rows whose timestamp
+    does not parse get missing values throughout.
+    """
+    completion_time = pd.to_datetime(transactions["Completion Time"], format=COMPLETION_TIME_FORMAT, errors="coerce")
+    transactions["Completion Time"] = completion_time
+    transactions["Hour"] = completion_time.dt.hour.astype("Int8")
+    transactions["Day of Week"] = completion_time.dt.dayofweek.astype("Int8")
+    transactions["Month"] = completion_time.dt.to_period("M")
+    transactions["Year"] = completion_time.dt.year.astype("Int16")
+    transactions["Half Year"] = ((completion_time.dt.month - 1) // 6 + 1).astype("Int8")
+    return transactions
+
+
+def process_page_tables(tables):
+    """Turn the transaction tables of one page into a converted frame"""
+    rows = TransactionRowBuilder()
+    for table in tables:
+        rows.add_table(table)
+    transactions = rows.build()
+
+    # Clean up the transaction data; amounts are kept in cents
+    for column in AMOUNT_COLUMNS:
+        if column in transactions.columns:
+            transactions[column] = parse_amounts(transactions[column], as_cents=True)
+
+    if "Statement Verification Code" in transactions.columns:
+        transactions.drop(columns=["Statement Verification Code"], inplace=True)
+
+    if "Completion Time" in transactions.columns:
+        add_time_dimensions(transactions)
+
+    if "Details" in transactions.columns:
+        add_counterparties(transactions)
+        # The fallback model runs once over the whole statement when it is assembled
+        transactions["Category"] = categorize_details(transactions["Details"], fallback=False)
+
+    return transactions
+
+
+def compact_transactions(transactions):
+    """Convert an assembled statement frame to its compact layout, in place
+
+    Amounts are already Int64 cents. The CATEGORICAL_COLUMNS and the
+    counterparty columns become Categoricals and Receipt No. an Arrow string
+    column, so no column holds one Python object per row.
+    """
+    for column in CATEGORICAL_COLUMNS:
+        if column in transactions.columns:
+            transactions[column] = transactions[column].astype("category")
+    if "Receipt No." in transactions.columns:
+        transactions["Receipt No."] = transactions["Receipt No."].astype(RECEIPT_DTYPE)
+    intern_counterparties(transactions)
+    return transactions
+
+
+def recategorize(statement):
+    """The statement with its Category recomputed under the current classification rules and model
+
+    The Details are kept with the statement, so a rules change needs no
+    reparse; each distinct Details value is matched once.
+    """
+    version = categories_version()
+    transactions = statement.transactions
+    if "Details" in transactions.columns:
+        transactions = transactions.assign(Category=categorize_details(transactions["Details"]).astype("category"))
+    return replace(statement, transactions=transactions, cube=None, rules_version=version, report_bases=())
+
+
+@dataclass
+class PageBatch:
+    """Converted and categorized transactions from one page of a statement"""
+    page_num: int
+    page_count: int
+    transactions: pd.DataFrame
+
+
+class StatementStream:
+    """Parses a statement page by page, yielding a PageBatch as each page is done
+
+    ``customer_info`` and ``page_count`` are filled in before the first batch is
+    yielded, and ``statement`` holds the assembled ParsedStatement once the
+    iteration finishes.
+    """
+
+    def __init__(self, source, workers=None, backend=DEFAULT_BACKEND):
+        if backend not in EXTRACTION_BACKENDS:
+            raise ValueError(f"Unknown extraction backend {backend!r}; expected one of {', '.join(EXTRACTION_BACKENDS)}")
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        self.source = source
+        self.workers = workers or EXTRACTION_WORKERS
+        self.backend = backend
+        self.layout = None
+        self.customer_info = {}
+        self.summary_table = None
+        self.page_count = None
+        self.row_count = 0
+        self.statement = None
+
+    def _iter_pages(self, pdf):
+        if self.workers <= 1 or self.page_count < PARALLEL_MIN_PAGES:
+            for page_num, page in enumerate(pdf.pages):
+                yield read_page(page, page_num, self.page_count, self.layout)
+        elif isinstance(self.source, (str, os.PathLike)):
+            yield from iter_pages_parallel(self.source, self.page_count, self.workers, self.layout)
+        else:
+            # Workers reopen the file by path, so spill in-memory uploads to disk first
+            self.source.seek(0)
+            with tempfile.NamedTemporaryFile(suffix=".pdf") as spill:
+                spill.write(self.source.read())
+                spill.flush()
+                yield from iter_pages_parallel(spill.name, self.page_count, self.workers, self.layout)
+
+    def __iter__(self):
+        batches = []
+
+        with pdfplumber.open(self.source) as pdf:
+            self.page_count = len(pdf.pages)
+
+            # The second page starts with a bare transaction table; learn its columns there
+            if self.backend == "text" and self.page_count > 1:
+                self.layout = ColumnLayout.learn(pdf.pages[1])
+                pdf.pages[1].close()
+
+            verification_code = None
+            # One sweep: customer info from the first page, tables from every
+            # page, the verification code from the last page
+            for page_num, (tables, text) in enumerate(self._iter_pages(pdf)):
+                if page_num == 0:
+                    self.customer_info = parse_customer_info(text)
+                    if tables:
+                        self.summary_table = pd.DataFrame(tables[0][1:], columns=tables[0][0])
+                        tables = tables[1:]
+                if page_num == self.page_count - 1:
+                    verification_code = parse_verification_code(text)
+
+                transactions = process_page_tables(tables)
+                transactions.index = pd.RangeIndex(self.row_count, self.row_count + len(transactions))
+                self.row_count += len(transactions)
+
+                batch = PageBatch(page_num, self.page_count, transactions)
+                batches.append(batch)
+                yield batch
+
+            self.customer_info["statement_verification_code"] = verification_code
+
+        self.statement = self._assemble(batches)
+
+    def _assemble(self, batches):
+        statement = ParsedStatement(summary_table=self.summary_table, customer_info=self.customer_info,
+                                    rules_version=categories_version())
+        if batches:
+            transactions = pd.concat([batch.transactions for batch in batches], ignore_index=True)
+            if "Category" in transactions.columns:
+                transactions["Category"] = fill_uncategorized(transactions["Details"], transactions["Category"])
+            statement.transactions = compact_transactions(transactions)
+        return statement
+
+
+def parse_statement(source, workers=None, backend=DEFAULT_BACKEND):
+    """Parse a statement PDF (path, file object or raw bytes) into a ParsedStatement
+
+    ``workers`` sets the number of extraction processes; 1 forces serial extraction.
+    ``backend`` picks one of EXTRACTION_BACKENDS.
+    """
+    stream = StatementStream(source, workers, backend)
+    for _ in stream:
+        pass
+    return stream.statement
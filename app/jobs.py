@@ -0,0 +1,218 @@
+"""Background parsing jobs, so an upload never blocks the Streamlit script thread
+
+Uploads are submitted to a process-wide JobRunner, which parses them on a small
+thread pool and records their progress in a job table. Jobs are keyed by the
+content hash of the upload, so submitting the same statement again (a rerun,
+a second tab, a second upload in the same tab) returns the existing job
+instead of starting over. Threads are enough here: long statements already
+fan their page extraction out to the extraction process pool, and the parsed
+statement lands in the in-process statement cache the pages read from.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+
+from extraction import SPAWN_CONTEXT, parse_statement
+from statement_cache import load_statement, statement_cache, statement_hash
+from statement_store import statement_store
+
+# Statements parsed at the same time; later submissions wait in the queue
+JOB_WORKERS = 2
+
+# Finished jobs kept in the table; the oldest are forgotten first
+MAX_FINISHED_JOBS = 64
+
+# Transactions kept on a running job for the page to preview
+PREVIEW_ROWS = 200
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFull(Exception):
+    """Raised by JobRunner.submit when ``max_pending`` jobs are already waiting or running"""
+
+
+class Job:
+    """Status and progress of one statement being parsed
+
+    Fields are written by the worker thread and read by the script thread;
+    each is replaced whole, never mutated in place.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.status = QUEUED
+        self.error = None
+        self.page_num = 0
+        self.page_count = None
+        self.row_count = 0
+        self.customer_info = {}
+        self.summary_table = None
+        self.preview = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._finished = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    @property
+    def progress(self):
+        """Share of pages parsed, between 0 and 1"""
+        if self.status == DONE:
+            return 1.0
+        if not self.page_count:
+            return 0.0
+        return self.page_num / self.page_count
+
+    def wait(self, timeout=None):
+        """Block until the job has finished or ``timeout`` seconds passed; True if finished"""
+        return self._finished.wait(timeout)
+
+    def _finish(self, status, error=None):
+        self.error = error
+        self.status = status
+        self.finished_at = time.time()
+        self._finished.set()
+
+    def _on_batch(self, stream, batch):
+        if batch.page_num == 0:
+            self.customer_info = dict(stream.customer_info)
+            self.summary_table = stream.summary_table
+        preview_rows = 0 if self.preview is None else len(self.preview)
+        if preview_rows < PREVIEW_ROWS and not batch.transactions.empty:
+            frames = [batch.transactions] if self.preview is None else [self.preview, batch.transactions]
+            self.preview = pd.concat(frames).head(PREVIEW_ROWS)
+        self.page_count = batch.page_count
+        self.row_count = stream.row_count
+        self.page_num = batch.page_num + 1
+
+
+class JobRunner:
+    """Thread pool plus a job table keyed by statement hash; no broker needed
+
+    With ``max_pending`` set, submit() refuses new statements while that many
+    jobs are waiting or running, so callers can push back on their clients.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_pending=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = self._make_executor(workers)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _make_executor(self, workers):
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="statement-job")
+
+    def submit(self, file_bytes, retry=False):
+        """Queue the uploaded bytes for parsing and return the job ID
+
+        Identical bytes map to the same job. A failed job is only run again
+        when ``retry`` is set, so a page polling a failed job does not keep
+        resubmitting it. Raises QueueFull when the queue is at ``max_pending``.
+        """
+        job_id = statement_hash(file_bytes)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and not (retry and job.status == FAILED):
+                return job_id
+            # Statements parsed before need no worker; the page loads them directly
+            parsed = job_id in statement_cache or job_id in statement_store
+            if not parsed and self.max_pending is not None and self._pending_count() >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} statements are already queued")
+            job = self._jobs[job_id] = Job(job_id)
+            self._jobs.move_to_end(job_id)
+            if parsed:
+                job._finish(DONE)
+            self._forget_finished()
+        if not job.finished:
+            self._start(job, file_bytes)
+        return job_id
+
+    def _start(self, job, file_bytes):
+        self._executor.submit(self._run, job, file_bytes)
+
+    def _pending_count(self):
+        return sum(1 for job in self._jobs.values() if not job.finished)
+
+    @property
+    def pending_count(self):
+        """Jobs waiting or running"""
+        with self._lock:
+            return self._pending_count()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job_id):
+        """Number of jobs submitted before ``job_id`` that are still waiting or running"""
+        with self._lock:
+            position = 0
+            for other_id, job in self._jobs.items():
+                if other_id == job_id:
+                    return position
+                if not job.finished:
+                    position += 1
+            return None
+
+    def shutdown(self):
+        """Stop the workers; queued jobs that have not started are dropped"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _run(self, job, file_bytes):
+        job.started_at = time.time()
+        job.status = RUNNING
+        try:
+            load_statement(file_bytes, on_batch=job._on_batch)
+        except Exception as error:
+            job._finish(FAILED, f"{type(error).__name__}: {error}")
+        else:
+            job._finish(DONE)
+
+
+class ProcessJobRunner(JobRunner):
+    """JobRunner that parses on a bounded pool of worker processes
+
+    Each statement is parsed start to finish inside one worker, so CPU-bound
+    parsing of several statements runs in parallel. Workers report nothing
+    until they are done: jobs stay queued, without page progress, until the
+    parsed statement comes back and is stored.
+    """
+
+    def _make_executor(self, workers):
+        return ProcessPoolExecutor(max_workers=workers, mp_context=SPAWN_CONTEXT)
+
+    def _start(self, job, file_bytes):
+        # One process per statement already; keep page extraction inside it serial
+        future = self._executor.submit(parse_statement, file_bytes, 1)
+        future.add_done_callback(lambda future: self._store(job, future))
+
+    def _store(self, job, future):
+        try:
+            statement = future.result()
+            statement_store.save(job.job_id, statement)
+            statement_cache.put(job.job_id, statement)
+        except Exception as error:
+            job._finish(FAILED, f"{type(error).__name__}: {error}")
+        else:
+            job.row_count = len(statement.transactions)
+            job._finish(DONE)
+
+
+# The Home page's runner; api.py starts a ProcessJobRunner of its own
+job_runner = JobRunner()
@@ -0,0 +1,238 @@
+"""Several statements of one customer merged into a single time-ordered ledger
+
+Customers hand in consecutive or overlapping statements. A Ledger appends the
+transactions of each one to the rows it already holds, dropping those an
+earlier statement already brought in, and keeps the rows of several
+statements sorted by Completion Time; a ledger of one statement holds that
+statement's frame as it came, without a copy. Statements arrive parsed, categorized and with their ingest
+columns, so only their new rows are rolled up and folded into the ledger's
+cube; the history is never re-enriched or re-aggregated. The new rows are
+queued and merged into the frame in one concat the next time it is read, so
+several statements added together cost a single copy of the history.
+
+Reports are incremental as well while statements only append later rows:
+the ledger's statement lists the report keys of its earlier states, and the
+report cache extends the report of the latest one it holds, computing the
+per-row series (balance and cumulative totals, amounts, the rolling anomaly
+scores) for the appended rows alone. An overlapping or earlier statement
+starts the next report afresh. The aggregates over categories and
+counterparties are computed over every row.
+"""
+import hashlib
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from analytics import RollupCube, report_key
+from categorization import categories_version
+from extraction import ParsedStatement, recategorize
+
+
+@dataclass
+class LedgerEntry:
+    """One statement merged into a ledger"""
+    key: str
+    name: str = None
+    customer_info: dict = field(default_factory=dict)
+    summary_table: pd.DataFrame = None
+    row_count: int = 0
+    added_count: int = 0
+
+    @property
+    def duplicate_count(self):
+        return self.row_count - self.added_count
+
+
+def rollup(transactions):
+    """The RollupCube of compact transactions, with amounts as compute_report sees them"""
+    statement = ParsedStatement(transactions=transactions)
+    outgoing = statement.outgoing_transactions
+    return RollupCube.build(statement.incoming_transactions, outgoing.assign(Withdrawn=outgoing["Withdrawn"].abs()))
+
+
+def share_categories(frames):
+    """The frames with one CategoricalDtype per Categorical column they all share
+
+    pd.concat turns Categoricals with different categories into objects; the
+    union is sorted like the categories compact_transactions creates.
+    """
+    frames = [frame.copy(deep=False) for frame in frames]
+    for column in frames[0].columns:
+        dtypes = [frame[column].dtype for frame in frames if column in frame.columns]
+        if len(dtypes) < len(frames) or not all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            continue
+        categories = dtypes[0].categories
+        for dtype in dtypes[1:]:
+            categories = categories.union(dtype.categories)
+        dtype = pd.CategoricalDtype(categories)
+        for frame in frames:
+            frame[column] = frame[column].astype(dtype)
+    return frames
+
+
+def in_time_order(transactions):
+    """The rows sorted by Completion Time, or as they are when already in order"""
+    if "Completion Time" not in transactions.columns or transactions["Completion Time"].is_monotonic_increasing:
+        return transactions
+    # Statements list the newest transaction first
+    return transactions.sort_values("Completion Time", kind="stable", na_position="last")
+
+
+class Ledger:
+    """Transactions of several statements, deduplicated on Receipt No. and in time order
+
+    add() merges one ParsedStatement at a time. Its rows are looked up in a
+    hash index of the receipts already in the ledger, so deduplication costs
+    O(new rows). Rows sharing a receipt within one statement (a transfer and
+    its charge, a Fuliza purchase and its overdraft) are all kept; a receipt
+    is only a duplicate if an earlier statement brought it in. Rows without
+    a receipt are always kept. The rows are folded into the cube at once and
+    merged into ``transactions`` when it is next read; until a second
+    statement comes in, that is the first statement's own frame.
+
+    ``rules_version`` is the version of the classification rules behind the
+    ledger's categories, None when they come from several; recategorize()
+    brings it up to date. A statement categorized under other rules than a
+    ledger that is up to date is recategorized as it is added.
+    """
+
+    def __init__(self):
+        self._transactions = pd.DataFrame()
+        self._pending = []
+        self.cube = None
+        self.statements = []
+        self.rules_version = None
+        self._receipts = set()
+        self._statement = None
+        # Report keys and row counts of earlier states the rows added since only append to
+        self._bases = []
+        self._latest = None
+
+    def __contains__(self, key):
+        return any(entry.key == key for entry in self.statements)
+
+    def __len__(self):
+        return len(self._transactions) + sum(len(rows) for rows in self._pending)
+
+    @property
+    def transactions(self):
+        """The ledger rows, with the rows added since the last read merged in"""
+        if self._pending:
+            self._transactions = self._merge(self._pending)
+            self._pending = []
+        return self._transactions
+
+    @property
+    def key(self):
+        """Hash identifying the merged statements; a single statement keeps its own"""
+        keys = [entry.key for entry in self.statements]
+        if len(keys) <= 1:
+            return keys[0] if keys else None
+        return hashlib.sha256("\n".join(keys).encode()).hexdigest()
+
+    def _is_new(self, receipts):
+        seen = self._receipts
+        values = receipts.to_numpy(dtype=object, na_value=None)
+        return np.fromiter((receipt is None or receipt not in seen for receipt in values), dtype=bool, count=len(values))
+
+    def add(self, key, statement, name=None):
+        """Merge a parsed statement; returns its LedgerEntry, or None if it was merged before"""
+        if key in self:
+            return None
+        if self.statements and statement.rules_version != self.rules_version and self.rules_version == categories_version():
+            # Categorized under other rules; its rows are brought in line with the ledger's
+            statement = recategorize(statement)
+        rows = statement.transactions
+        if "Receipt No." in rows.columns:
+            new = self._is_new(rows["Receipt No."])
+            if not new.all():
+                rows = rows[new]
+            self._receipts.update(rows["Receipt No."].dropna())
+
+        if not rows.empty:
+            if not self._follows(rows):
+                self._bases = []
+            times = rows.get("Completion Time", pd.Series(dtype="datetime64[ns]"))
+            if times.notna().any():
+                self._latest = times.max() if self._latest is None else max(self._latest, times.max())
+            cube = rollup(rows)
+            self.cube = cube if self.cube is None else self.cube.combine(cube)
+            self._pending.append(rows)
+
+        entry = LedgerEntry(key, name, statement.customer_info, statement.summary_table,
+                            row_count=len(statement.transactions), added_count=len(rows))
+        if not self.statements:
+            self.rules_version = statement.rules_version
+        elif statement.rules_version != self.rules_version:
+            # Categories of several rules versions, until recategorize()
+            self.rules_version = None
+        self.statements.append(entry)
+        self._statement = None
+        return entry
+
+    def _follows(self, rows):
+        """Whether every row has a Completion Time after all of the ledger's"""
+        if "Completion Time" not in rows.columns or rows["Completion Time"].isna().any():
+            return False
+        return self._latest is None or rows["Completion Time"].min() > self._latest
+
+    def recategorize(self):
+        """Recategorize the ledger's rows under the current classification rules and rebuild its cube"""
+        statement = recategorize(ParsedStatement(transactions=self.transactions))
+        self._transactions = statement.transactions
+        self.cube = rollup(self._transactions) if not self._transactions.empty else None
+        self.rules_version = statement.rules_version
+        self._statement = None
+        self._bases = []
+
+    def _merge(self, chunks):
+        """The ledger rows with ``chunks`` merged in, in one concat
+
+        A single statement's frame is used as it is; the rows of several are
+        put in time order.
+        """
+        frames = chunks if self._transactions.empty else [self._transactions] + chunks
+        if len(frames) == 1:
+            frame = frames[0]
+            return frame if frame.index.equals(pd.RangeIndex(len(frame))) else frame.reset_index(drop=True)
+        merged = pd.concat(share_categories([in_time_order(frame) for frame in frames]), ignore_index=True)
+        # Consecutive statements only append; an overlap or a gap filled in needs one sort
+        if "Completion Time" in merged.columns and not merged["Completion Time"].is_monotonic_increasing:
+            merged = merged.sort_values("Completion Time", kind="stable", na_position="last", ignore_index=True)
+        return merged
+
+    @property
+    def statement(self):
+        """The ledger as one ParsedStatement carrying its cube
+
+        Header fields come from the statement added last. With several
+        statements the period spans the ledger's transactions, and the
+        per-statement summary table and verification code are left out.
+        """
+        if self._statement is None and self.statements:
+            latest = self.statements[-1]
+            customer_info = dict(latest.customer_info)
+            summary_table = latest.summary_table
+            if len(self.statements) > 1:
+                summary_table = None
+                customer_info["statement_verification_code"] = None
+                times = self.transactions.get("Completion Time", pd.Series(dtype="datetime64[ns]")).dropna()
+                if not times.empty:
+                    customer_info["statement_period"] = f"{times.iloc[0]:%d %b %Y} - {times.iloc[-1]:%d %b %Y}"
+            self._statement = ParsedStatement(summary_table, customer_info, self.transactions, cube=self.cube,
+                                              rules_version=self.rules_version, report_bases=tuple(self._bases))
+            # Rows in time order stay the first rows of the ledger while later statements only append
+            times = self.transactions.get("Completion Time")
+            if times is not None and times.is_monotonic_increasing and times.notna().all():
+                self._bases.append((report_key(self.key, self._statement), len(self.transactions)))
+        return self._statement
+
+    def summary(self):
+        """One row per merged statement with its transactions and how many were new"""
+        return pd.DataFrame({
+            "Statement": [entry.name or entry.key[:12] for entry in self.statements],
+            "Statement Period": [entry.customer_info.get("statement_period") for entry in self.statements],
+            "Transactions": [entry.row_count for entry in self.statements],
+            "New Transactions": [entry.added_count for entry in self.statements],
+        })
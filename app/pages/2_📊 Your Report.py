@@ -1,92 +1,69 @@
 import streamlit as st
 
-if "transaction_data" not in st.session_state:
+if "statement" not in st.session_state:
     st.warning("Please upload your statement on the Home page first.")
     st.stop()
-import pdfplumber
-import pandas as pd
-import re
-import matplotlib.pyplot as plt
+from datetime import timedelta
+
 import plotly.express as px
-import numpy as np
 import plotly.graph_objects as go
 
-transaction_data = st.session_state["transaction_data"]
-incoming_transactions = st.session_state["incoming_transactions"]
-outgoing_transactions = st.session_state["outgoing_transactions"]
-
-# Convert all negative values in the 'Withdrawn' column to positive
-outgoing_transactions["Withdrawn"] = outgoing_transactions["Withdrawn"].abs()
+from analytics import CHARGES_CATEGORIES, report_cache
+from anomalies import ANOMALY_Z_THRESHOLD, flagged_transactions, score_transactions
+from downsampling import MAX_CHART_POINTS, WEBGL_MIN_POINTS, downsample
 
+DAY_NAMES = {0: 'Mon', 1: 'Tue', 2: 'Wed', 3: 'Thu', 4: 'Fri', 5: 'Sat', 6: 'Sun'}
 
-# Overview Section: Insights Table
-st.header("Overview")
 
-# Calculate Total Transactions
-total_transactions = transaction_data.shape[0]
+def zoom_range(label, times, key):
+    """(start, end) picked on a slider; only offered for series over the point budget"""
+    times = times.dropna()
+    if len(times) <= MAX_CHART_POINTS:
+        return None, None
+    first, last = times.min().to_pydatetime(), times.max().to_pydatetime()
+    return st.slider(label, min_value=first, max_value=last, value=(first, last), step=timedelta(hours=1), key=key)
 
-# Calculate Total Incoming and Outgoing
-total_incoming = incoming_transactions["Paid In"].sum()
-total_outgoing = outgoing_transactions["Withdrawn"].abs().sum()
 
-# Top 5 Categories by Volume
-incoming_top_categories_by_volume = (
-    incoming_transactions["Category"]
-    .value_counts()
-    .head(5)
-    .reset_index()
-    .rename(columns={"index": "Category", "Category": "Category", "count":"Number of Transactions"})
-)
+def scatter_trace(points):
+    """WebGL traces once a chart carries many points"""
+    return go.Scattergl if len(points) > WEBGL_MIN_POINTS else go.Scatter
 
-outgoing_top_categories_by_volume = (
-    outgoing_transactions["Category"]
-    .value_counts()
-    .head(5)
-    .reset_index()
-    .rename(columns={"index": "Category", "Category": "Category", "count":"Number of Transactions"})
-)
 
-# Top 5 Categories by Value
-incoming_top_categories_by_value = (
-    incoming_transactions.groupby("Category")["Paid In"].sum()
-    .sort_values(ascending=False)
-    .head(5)
-    .reset_index()
-    .rename(columns={"Paid In": "Amount"})
-)
+# The Home page keeps the parsed statement in the session, shared with the statement cache
+statement_key = st.session_state.get("statement_key")
+statement = st.session_state["statement"]
 
-# Format incoming values to two decimal places
-incoming_top_categories_by_value["Amount"] = incoming_top_categories_by_value["Amount"].apply(lambda x: f"{x:,.2f}")
+# All aggregates are computed once per statement; this page only renders them
+report = report_cache.get_or_compute(statement_key, statement)
 
-outgoing_top_categories_by_value = (
-    outgoing_transactions.groupby("Category")["Withdrawn"].sum()
-    .abs()
-    .sort_values(ascending=False)
-    .head(5)
-    .reset_index()
-    .rename(columns={"Withdrawn": "Amount"})
-)
 
-# Format outgoing values to two decimal places
-outgoing_top_categories_by_value["Amount"] = outgoing_top_categories_by_value["Amount"].apply(lambda x: f"{x:,.2f}")
+# Overview Section: Insights Table
+st.header("Overview")
 
+# Format values to two decimal places
+incoming_top_categories_by_value = report.incoming_top_categories_by_value.assign(
+    Amount=report.incoming_top_categories_by_value["Amount"].apply(lambda x: f"{x:,.2f}")
+)
+outgoing_top_categories_by_value = report.outgoing_top_categories_by_value.assign(
+    Amount=report.outgoing_top_categories_by_value["Amount"].apply(lambda x: f"{x:,.2f}")
+)
 
 # Display Summary Insights
 st.subheader("Insights")
-st.write(f"**Total Transactions:** {total_transactions}")
-st.write(f"**Total Incoming Transactions:** KSh. {total_incoming:,.2f}")
-st.write(f"**Total Outgoing Transactions:** KSh. {total_outgoing:,.2f}")
+st.write(f"**Total Transactions:** {report.total_transactions}")
+st.write(f"**Total Incoming Transactions:** KSh. {report.total_incoming:,.2f}")
+st.write(f"**Total Outgoing Transactions:** KSh. {report.total_outgoing:,.2f}")
 
 # Display Top 5 Categories by Volume and Value side by side
 col1, col2 = st.columns(2)
 
 with col1:
     st.write("### Top 5 Incoming Categories by Volume")
-    st.table(incoming_top_categories_by_volume)
+    st.table(report.incoming_top_categories_by_volume)
 
 with col2:
     st.write("### Top 5 Outgoing Categories by Volume")
-    st.table(outgoing_top_categories_by_volume)
+    st.table(report.outgoing_top_categories_by_volume)
 
 col3, col4 = st.columns(2)
 
@@ -105,32 +82,9 @@ time_period = st.selectbox(
     index=0  # Default is Daily
 )
 
-# Convert 'Completion Time' to datetime format if it's not already
-incoming_transactions['Completion Time'] = pd.to_datetime(incoming_transactions['Completion Time'], errors='coerce')
-outgoing_transactions['Completion Time'] = pd.to_datetime(outgoing_transactions['Completion Time'], errors='coerce')
-
-
-# Function to group data based on selected time period
-def group_transactions_by_time_period(df, time_period):
-    if time_period == "Daily":
-        # Group by day
-        return df.groupby(df['Completion Time'].dt.date).size().reset_index(name='Transaction Count')
-    elif time_period == "Monthly":
-        # Group by month (convert Period to string)
-        df['Month'] = df['Completion Time'].dt.to_period('M').astype(str)
-        return df.groupby('Month').size().reset_index(name='Transaction Count')
-    elif time_period == "6 Months":
-        # Group by 6 months (using custom period)
-        df['6 Months Period'] = df['Completion Time'].dt.to_period("M").apply(lambda x: f"{x.year}-{(x.month-1)//6+1}H")
-        return df.groupby('6 Months Period').size().reset_index(name='Transaction Count')
-    elif time_period == "Yearly":
-        # Group by year and ensure the year is displayed as an integer
-        df['Year'] = df['Completion Time'].dt.year
-        return df.groupby('Year').size().reset_index(name='Transaction Count')
-
-# Group incoming and outgoing transactions based on selected time period
-incoming_grouped = group_transactions_by_time_period(incoming_transactions, time_period)
-outgoing_grouped = group_transactions_by_time_period(outgoing_transactions, time_period)
+# Slice the precomputed rollup cube; no pass over the transactions
+incoming_grouped = report.cube.volume_over_time("Incoming", time_period)
+outgoing_grouped = report.cube.volume_over_time("Outgoing", time_period)
 
 # Plot the grouped data
 fig = go.Figure()
@@ -162,11 +116,10 @@ col1, col2 = st.columns(2)
 
 # Pie Chart for Money In (Incoming Transactions)
 with col1:
-    
+
     money_in_pie = px.pie(
-        incoming_transactions,
-        names="Category",
-        values="Paid In",
+        names=report.incoming_by_category.index,
+        values=report.incoming_by_category.values,
         title="Distribution of Money In by Category",
         template="plotly_dark",
         hole=0.4  # For a donut-style chart
@@ -175,11 +128,10 @@ with col1:
 
 # Pie Chart for Money Out (Outgoing Transactions)
 with col2:
-    
+
     money_out_pie = px.pie(
-        outgoing_transactions,
-        names="Category",
-        values=outgoing_transactions["Withdrawn"].abs(),  # Convert to positive
+        names=report.outgoing_by_category.index,
+        values=report.outgoing_by_category.values,
         title="Distribution of Money Out by Category",
         template="plotly_dark",
         hole=0.4  # For a donut-style chart
@@ -187,71 +139,14 @@ with col2:
     st.plotly_chart(money_out_pie)
 
 
-# Define the keywords for send and receive money transactions
-send_keywords = ["Customer Transfer Fuliza MPesa", "Customer Transfer to -"]
-receive_keywords = ["Funds received from -"]
-
-# Function to classify transactions based on keywords
-def classify_transactions(df, keywords, transaction_type):
-    # Search for the keywords in the 'Details' column
-    if transaction_type == 'send':
-        return df[df['Details'].str.contains('|'.join(keywords), case=False, na=False)]
-    elif transaction_type == 'receive':
-        return df[df['Details'].str.contains('|'.join(keywords), case=False, na=False)]
-
-# Classify incoming transactions as "Receive" based on the defined receive_keywords
-incoming_transactions_filtered = classify_transactions(incoming_transactions, receive_keywords, 'receive')
-
-# Classify outgoing transactions as "Send" based on the defined send_keywords
-outgoing_transactions_filtered = classify_transactions(outgoing_transactions, send_keywords, 'send')
-
-# Function to extract and format names from the Details column
-
-def extract_name(details):
-    # Replace line breaks with a space
-    details = re.sub(r'\n', ' ', details)
-    
-    # Use re.DOTALL to make . match newline characters
-    match = re.search(r'\d{3}\*\*\*\*\*\*\d{3}\s+(.*)', details, re.DOTALL)
-    if match:
-        # Extract the name, strip any leading/trailing whitespace, and format it to title case
-        name = match.group(1).strip().title()
-        return name
-    return None  # Return None if no match is found
-
-# Apply the extraction function to the Details column for outgoing transactions
-outgoing_transactions_filtered['Recipient'] = outgoing_transactions_filtered['Details'].apply(extract_name)
-
-# Apply the extraction function to the Details column for incoming transactions
-incoming_transactions_filtered['Sender'] = incoming_transactions_filtered['Details'].apply(extract_name)
-
-# Get the top 10 destinations (recipients) for incoming transactions by amount
-
-top_recipients_by_amount = (
-    outgoing_transactions_filtered.groupby('Recipient')['Withdrawn']
-    .sum()
-    .abs()
-    .sort_values(ascending=False)
-    .head(10)
-    .reset_index()
-    .rename(columns={"Withdrawn": "Total Amount"})
+# Format the amounts to two decimal places
+top_senders_by_amount = report.top_senders_by_amount.assign(
+    **{"Total Amount": report.top_senders_by_amount["Total Amount"].apply(lambda x: f"{x:,.2f}")}
 )
-
-# Get the top 10 sources (senders) for outgoing transactions by amount
-top_senders_by_amount = (
-    incoming_transactions_filtered.groupby('Sender')['Paid In']
-    .sum()
-    .sort_values(ascending=False)
-    .head(10)
-    .reset_index()
-    .rename(columns={"Paid In": "Total Amount"})
+top_recipients_by_amount = report.top_recipients_by_amount.assign(
+    **{"Total Amount": report.top_recipients_by_amount["Total Amount"].apply(lambda x: f"{x:,.2f}")}
 )
 
-# Format the amounts to two decimal places
-top_senders_by_amount["Total Amount"] = top_senders_by_amount["Total Amount"].apply(lambda x: f"{x:,.2f}")
-top_recipients_by_amount["Total Amount"] = top_recipients_by_amount["Total Amount"].apply(lambda x: f"{x:,.2f}")
-
-
 # Create two columns to display the tables side by side
 col1, col2 = st.columns(2)
 
@@ -264,27 +159,16 @@ with col1:
 with col2:
     st.write("### Top 10 Recipients by Amount")
     st.dataframe(top_recipients_by_amount)
-		
-
 
-# Extract time components
-incoming_transactions['Hour'] = incoming_transactions['Completion Time'].dt.hour
-incoming_transactions['Day of Week'] = incoming_transactions['Completion Time'].dt.dayofweek
-incoming_transactions['Month'] = incoming_transactions['Completion Time'].dt.month
 
-outgoing_transactions['Hour'] = outgoing_transactions['Completion Time'].dt.hour
-outgoing_transactions['Day of Week'] = outgoing_transactions['Completion Time'].dt.dayofweek
-outgoing_transactions['Month'] = outgoing_transactions['Completion Time'].dt.month
-
-# Group by time components and sum the amounts
-incoming_hourly = incoming_transactions.groupby(['Day of Week', 'Hour'])['Paid In'].sum().unstack().fillna(0)
-outgoing_hourly = outgoing_transactions.groupby(['Day of Week', 'Hour'])['Withdrawn'].sum().abs().unstack().fillna(0)
+incoming_hourly = report.cube.weekday_hour_amounts("Incoming")
+outgoing_hourly = report.cube.weekday_hour_amounts("Outgoing")
 
 # Create a heatmap for hourly incoming patterns
 fig_incoming_hourly = go.Figure(data=go.Heatmap(
     z=incoming_hourly.values,
     x=incoming_hourly.columns,
-    y=incoming_hourly.index.map({0: 'Mon', 1: 'Tue', 2: 'Wed', 3: 'Thu', 4: 'Fri', 5: 'Sat', 6: 'Sun'}),
+    y=incoming_hourly.index.map(DAY_NAMES),
     colorscale='Blues',
     name='Incoming Transactions'
 ))
@@ -301,7 +185,7 @@ fig_incoming_hourly.update_layout(
 fig_outgoing_hourly = go.Figure(data=go.Heatmap(
     z=outgoing_hourly.values,
     x=outgoing_hourly.columns,
-    y=outgoing_hourly.index.map({0: 'Mon', 1: 'Tue', 2: 'Wed', 3: 'Thu', 4: 'Fri', 5: 'Sat', 6: 'Sun'}),
+    y=outgoing_hourly.index.map(DAY_NAMES),
     colorscale='Reds',
     name='Outgoing Transactions'
 ))
@@ -317,26 +201,23 @@ fig_outgoing_hourly.update_layout(
 col1, col2 = st.columns(2)
 
 with col1:
-    #st.write("### Hourly Incoming Transactions")
     st.plotly_chart(fig_incoming_hourly)
 
 with col2:
-    #st.write("### Hourly Outgoing Transactions")
     st.plotly_chart(fig_outgoing_hourly)
 
-# Ensure the 'Completion Time' column is in datetime format
-transaction_data['Completion Time'] = pd.to_datetime(transaction_data['Completion Time'], errors='coerce')
-
-# Sort the transactions by completion time
-transaction_data = transaction_data.sort_values(by='Completion Time')
+# Downsample the balance to the point budget, at full detail within the zoomed range
+start, end = zoom_range("Zoom balance chart", report.balance_over_time['Completion Time'], key="balance_zoom")
+balance = downsample(report.balance_over_time, 'Completion Time', ['Balance'], start=start, end=end)
 
 # Create a line chart for the account balance over time
 fig_balance = go.Figure()
 
-fig_balance.add_trace(go.Scatter(
-    x=transaction_data['Completion Time'],
-    y=transaction_data['Balance'],
-    mode='lines+markers',
+fig_balance.add_trace(scatter_trace(balance)(
+    x=balance['Completion Time'],
+    y=balance['Balance'],
+    # Markers only while every transaction is shown
+    mode='lines+markers' if start is None else 'lines',
     name='Account Balance'
 ))
 
@@ -351,55 +232,21 @@ fig_balance.update_layout(
 
 st.plotly_chart(fig_balance)
 
-# Define the charges categories
-charges_categories = ["Charges (Till)", "Charges (Send Money)", "Charges (Paybill)"]
-
-# Filter charges transactions
-charges_transactions = outgoing_transactions[outgoing_transactions['Category'].isin(charges_categories)]
-
-# Group the charges transactions by month and category
-charges_grouped = charges_transactions.groupby([pd.Grouper(key='Completion Time', freq='M'), 'Category'])['Withdrawn'].sum().reset_index()
-
-# Group the non-charges transactions by month and category
-non_charges_transactions = outgoing_transactions[~outgoing_transactions['Category'].isin(charges_categories)]
-#non_charges_grouped = non_charges_transactions.groupby([pd.Grouper(key='Completion Time', freq='M'), 'Category'])['Withdrawn'].sum().reset_index()
-
-# Convert negative values to positive
-charges_grouped['Withdrawn'] = charges_grouped['Withdrawn'].abs()
-
 # Create a stacked bar chart
 fig_charges = px.bar(
-    charges_grouped,
-    x='Completion Time',
-    y='Withdrawn',
+    report.cube.monthly_amounts("Outgoing", CHARGES_CATEGORIES),
+    x='Month',
+    y='Amount',
     color='Category',
     barmode='stack',
     title="Charges Breakdown Over Time",
-    labels={'Completion Time': 'Month', 'Withdrawn': 'Amount', 'Category': 'Transaction Category'},
+    labels={'Category': 'Transaction Category'},
     template="plotly_dark"
 )
 
 
 st.plotly_chart(fig_charges)
 
-# Combine the transactions into a single dataframe
-categorized_transactions = pd.concat([incoming_transactions, outgoing_transactions])
-
-# Extract time components
-categorized_transactions['Completion Time'] = pd.to_datetime(categorized_transactions['Completion Time'], errors='coerce')
-categorized_transactions['Day of Week'] = categorized_transactions['Completion Time'].dt.dayofweek
-categorized_transactions['Month'] = categorized_transactions['Completion Time'].dt.to_period('M').astype(str)
-categorized_transactions['Year'] = categorized_transactions['Completion Time'].dt.to_period('Y').astype(str)
-
-# Group by category and time period
-def group_transactions_by_time(df, time_period):
-    if time_period == "Daily":
-        return df.groupby(['Category', 'Day of Week'])['Paid In'].sum().unstack().fillna(0)
-    elif time_period == "Monthly":
-        return df.groupby(['Category', 'Month'])['Paid In'].sum().unstack().fillna(0)
-    elif time_period == "Yearly":
-        return df.groupby(['Category', 'Year'])['Paid In'].sum().unstack().fillna(0)
-
 # Add a dropdown to let the user select the time period
 time_period = st.selectbox(
     "Select Time Period",
@@ -407,13 +254,12 @@ time_period = st.selectbox(
     index=0  # Default is Daily
 )
 
-# Group the transactions based on the selected time period
-frequency_data = group_transactions_by_time(categorized_transactions, time_period)
+frequency_data = report.cube.incoming_by_category_and_period(time_period)
 
 # Create the heatmap
 fig = go.Figure(data=go.Heatmap(
     z=frequency_data.values,
-    x=frequency_data.columns.map({0: 'Mon', 1: 'Tue', 2: 'Wed', 3: 'Thu', 4: 'Fri', 5: 'Sat', 6: 'Sun'}) if time_period == "Daily" else frequency_data.columns,
+    x=frequency_data.columns.map(DAY_NAMES) if time_period == "Daily" else frequency_data.columns,
     y=frequency_data.index,
     colorscale='Blues',
     name='Transaction Amount'
@@ -431,30 +277,29 @@ fig.update_layout(
 st.subheader("Transaction Amount Analysis")
 
 st.plotly_chart(fig)
-		
-# Extract time components
-categorized_transactions['Completion Time'] = pd.to_datetime(categorized_transactions['Completion Time'], errors='coerce')
-categorized_transactions = categorized_transactions.sort_values(by='Completion Time')
 
-# Calculate cumulative sums
-categorized_transactions['Cumulative Paid In'] = categorized_transactions['Paid In'].cumsum()
-categorized_transactions['Cumulative Withdrawn'] = categorized_transactions['Withdrawn'].cumsum()
+# Downsample both cumulative series to the point budget
+start, end = zoom_range("Zoom cumulative chart", report.cumulative_totals['Completion Time'], key="cumulative_zoom")
+cumulative_totals = downsample(
+    report.cumulative_totals, 'Completion Time', ['Cumulative Paid In', 'Cumulative Withdrawn'], start=start, end=end
+)
+trace = scatter_trace(cumulative_totals)
 
 # Create the area chart
 fig = go.Figure()
 
-fig.add_trace(go.Scatter(
-    x=categorized_transactions['Completion Time'],
-    y=categorized_transactions['Cumulative Paid In'],
+fig.add_trace(trace(
+    x=cumulative_totals['Completion Time'],
+    y=cumulative_totals['Cumulative Paid In'],
     mode='lines',
     name='Cumulative Receiving',
     fill='tozeroy',  # Fill area under the line
     line=dict(color='blue')
 ))
 
-fig.add_trace(go.Scatter(
-    x=categorized_transactions['Completion Time'],
-    y=categorized_transactions['Cumulative Withdrawn'],
+fig.add_trace(trace(
+    x=cumulative_totals['Completion Time'],
+    y=cumulative_totals['Cumulative Withdrawn'],
     mode='lines',
     name='Cumulative Spending',
     fill='tozeroy',  # Fill area under the line
@@ -474,13 +319,6 @@ fig.update_layout(
 st.subheader("Cumulative Spending vs. Receiving Over Time")
 
 st.plotly_chart(fig)
-		
-
-# Extract time components
-categorized_transactions['Completion Time'] = pd.to_datetime(categorized_transactions['Completion Time'], errors='coerce')
-categorized_transactions = categorized_transactions.sort_values(by='Completion Time')
-categorized_transactions['Month'] = categorized_transactions['Completion Time'].dt.to_period('M').astype(str)
-categorized_transactions['Year'] = categorized_transactions['Completion Time'].dt.to_period('Y').astype(str)
 
 # Add a dropdown to let the user select the time period
 time_period = st.selectbox(
@@ -489,15 +327,7 @@ time_period = st.selectbox(
     index=0  # Default is Monthly
 )
 
-# Group by category and time period
-def group_transactions_by_time(df, time_period):
-    if time_period == "Monthly":
-        return df.groupby(['Category', 'Month'])['Paid In'].sum().unstack().fillna(0)
-    elif time_period == "Yearly":
-        return df.groupby(['Category', 'Year'])['Paid In'].sum().unstack().fillna(0)
-
-# Group the transactions based on the selected time period
-trends_data = group_transactions_by_time(categorized_transactions, time_period)
+trends_data = report.cube.incoming_by_category_and_period(time_period)
 
 # Create the multi-line chart
 fig = go.Figure()
@@ -524,16 +354,12 @@ st.subheader("Category Trends Analysis")
 
 st.plotly_chart(fig)
 
-# Extract the transaction amounts
-incoming_amounts = incoming_transactions['Paid In']
-outgoing_amounts = outgoing_transactions['Withdrawn'].abs()  # Convert to positive
-
 # Create the histograms
 fig = go.Figure()
 
 # Add histogram for incoming transactions
 fig.add_trace(go.Histogram(
-    x=incoming_amounts,
+    x=report.incoming_amounts,
     name='Incoming Transactions',
     marker_color='blue',
     opacity=0.75
@@ -541,7 +367,7 @@ fig.add_trace(go.Histogram(
 
 # Add histogram for outgoing transactions
 fig.add_trace(go.Histogram(
-    x=outgoing_amounts,
+    x=report.outgoing_amounts,
     name='Outgoing Transactions',
     marker_color='red',
     opacity=0.75
@@ -561,22 +387,14 @@ fig.update_layout(
 st.subheader("Transaction Amount Distribution")
 
 st.plotly_chart(fig)
-		
-# Filter for savings deposits and withdrawals
-savings_deposits = categorized_transactions[categorized_transactions['Category'] == "M-Shwari Deposit"]
-savings_withdrawals = categorized_transactions[categorized_transactions['Category'] == "M-Shwari Withdrawal"]
-
-# Ensure deposit amounts are positive
-savings_deposits['Withdrawn'] = savings_deposits['Withdrawn'].abs()
-
 
 # Create the line chart
 fig = go.Figure()
 
 # Add line for withdrawn
 fig.add_trace(go.Scatter(
-    x=savings_withdrawals['Completion Time'],
-    y=savings_withdrawals['Paid In'],
+    x=report.savings_withdrawals['Completion Time'],
+    y=report.savings_withdrawals['Paid In'],
     mode='lines',
     name='Withdrawals',
     line=dict(color='red')
@@ -584,8 +402,8 @@ fig.add_trace(go.Scatter(
 
 # Add line for deposits
 fig.add_trace(go.Scatter(
-    x=savings_deposits['Completion Time'],
-    y=savings_deposits['Withdrawn'],
+    x=report.savings_deposits['Completion Time'],
+    y=report.savings_deposits['Withdrawn'],
     mode='lines',
     name='Deposits',
     line=dict(color='blue')
@@ -606,16 +424,12 @@ st.subheader("Savings Trends Analysis")
 st.plotly_chart(fig)
 
 
-# Count the number of transactions in each category
-transaction_counts = categorized_transactions['Category'].value_counts().reset_index()
-transaction_counts.columns = ['Category', 'Count']
-
 # Create the horizontal bar chart
 fig = go.Figure()
 
 fig.add_trace(go.Bar(
-    y=transaction_counts['Category'],
-    x=transaction_counts['Count'],
+    y=report.transaction_counts['Category'],
+    x=report.transaction_counts['Count'],
     orientation='h',
     marker_color='blue'
 ))
@@ -634,25 +448,12 @@ st.subheader("Transaction Count by Category")
 
 st.plotly_chart(fig)
 
-# Define the keywords for customer transfers
-transfer_keywords = ["Customer Transfer to -", "Funds received from -"]
-
-# Apply the extraction function to the Details column for outgoing transactions
-outgoing_transactions['Recipient'] = outgoing_transactions['Details'].apply(extract_name)
-
-# Filter customer transfers
-customer_transfers = outgoing_transactions[outgoing_transactions['Details'].str.contains('|'.join(transfer_keywords), case=False, na=False)]
-
-# Calculate the average transaction amount for each recipient
-average_transaction_amounts = customer_transfers.groupby('Recipient')['Withdrawn'].mean().abs().reset_index()
-average_transaction_amounts = average_transaction_amounts.sort_values(by='Withdrawn', ascending=False).head(10)
-
 # Create the bar chart
 fig = go.Figure()
 
 fig.add_trace(go.Bar(
-    x=average_transaction_amounts['Withdrawn'],
-    y=average_transaction_amounts['Recipient'],
+    x=report.average_amount_by_recipient['Withdrawn'],
+    y=report.average_amount_by_recipient['Recipient'],
     orientation='h',
     marker_color='blue'
 ))
@@ -672,71 +473,29 @@ st.subheader("Customer Behavior Analysis: Average Transaction Amount by Recipien
 st.plotly_chart(fig)
 
 
-
-# Identify frequent transactions
-frequent_recipients = (
-    outgoing_transactions_filtered['Recipient']
-    .value_counts()
-    .reset_index()
-    .rename(columns={"index": "Recipient", "Recipient": "Count"})
-    .sort_values(by="Count", ascending=False)
-    .head(10)
-)
-
-frequent_senders = (
-    incoming_transactions_filtered['Sender']
-    .value_counts()
-    .reset_index()
-    .rename(columns={"index": "Sender", "Sender": "Count"})
-    .sort_values(by="Count", ascending=False)
-    .head(10)
-)
-
-
-
 # Display the results in the Streamlit app
 st.subheader("Anomaly Detection")
+st.write(
+    f"Transactions whose amount, or time since the previous transaction of the same category, is far from "
+    f"the category's recent pattern (robust z-score of {ANOMALY_Z_THRESHOLD} or more)."
+)
+
+# The forest is fit once per set of categories and cached for the process
+if st.checkbox("Also score with an Isolation Forest"):
+    categorized = statement.categorized_transactions()
+    anomalies = flagged_transactions(categorized, score_transactions(categorized, isolation_forest=True))
+else:
+    anomalies = report.anomalies
 
+st.write(f"**Unusual Transactions:** {len(anomalies):,} of {report.total_transactions:,}")
+st.dataframe(anomalies, hide_index=True)
 
 col3, col4 = st.columns(2)
 
 with col3:
     st.write("#### Top 10 Frequent Senders")
-    st.dataframe(frequent_senders)
+    st.dataframe(report.frequent_senders)
 
 with col4:
     st.write("#### Top 10 Frequent Recipients")
-    st.dataframe(frequent_recipients)
-
-
-# Scatter plots for visualizing transactions
-# fig_incoming_scatter = px.scatter(
-#     incoming_transactions,
-#     x='Completion Time',
-#     y='Paid In',
-#     title='Incoming Transactions',
-#     hover_data=['Details']
-# )
-
-# fig_outgoing_scatter = px.scatter(
-#     outgoing_transactions,
-#     x='Completion Time',
-#     y='Withdrawn',
-#     title='Outgoing Transactions',
-#     hover_data=['Details'],
-#     color_discrete_sequence=['red'] 
-# )
-
-# col7, col8 = st.columns(2)
-
-# with col7:
-  
-#     st.plotly_chart(fig_incoming_scatter)
-
-# with col8:
-   
-#     st.plotly_chart(fig_outgoing_scatter)
-
-
-# col9, col10 = st.columns(2)
-
+    st.dataframe(report.frequent_recipients)
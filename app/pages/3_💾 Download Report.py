@@ -1,4 +1,59 @@
 import streamlit as st
 
 st.title("Download Report")
-st.info("This feature is coming soon!")
\ No newline at end of file
+
+if "statement" not in st.session_state:
+    st.warning("Please upload your statement on the Home page first.")
+    st.stop()
+
+from pdf_report import report_renderer
+
+# Seconds between checks while the report renders in the background
+POLL_SECONDS = 1
+
+
+def read_report(path):
+    # Called only when the button is clicked, so the PDF is not held in the session. Streamlit
+    # serves downloads from memory whatever it is given; only the HTTP API streams the file
+    with open(path, "rb") as handle:
+        return handle.read()
+
+
+@st.fragment(run_every=POLL_SECONDS)
+def wait_for_report(statement_key):
+    """Poll the background render; reruns the whole page once it has finished"""
+    future = report_renderer.get(statement_key, st.session_state["statement"])
+    if future is None or future.done():
+        st.rerun()
+    st.info("Rendering the PDF report...")
+
+
+st.write(
+    "A PDF with the overview tables and the key charts from **Your Report**. "
+    "It is prepared in the background; repeat downloads reuse the finished file."
+)
+
+# Rendering starts as soon as the page opens; charts are cached per statement
+statement_key = st.session_state["statement_key"]
+future = report_renderer.get(statement_key, st.session_state["statement"])
+if future is not None and future.done() and future.exception() is not None:
+    st.error(f"The report could not be rendered. {future.exception()}")
+    if st.button("Try again"):
+        report_renderer.submit(statement_key, st.session_state["statement"])
+        st.rerun()
+    st.stop()
+
+future = report_renderer.submit(statement_key, st.session_state["statement"])
+if not future.done():
+    wait_for_report(statement_key)
+    st.stop()
+
+report_path = future.result()
+st.success("Your report is ready.")
+st.download_button(
+    "Download PDF report",
+    data=lambda: read_report(report_path),
+    file_name="mpesa_report.pdf",
+    mime="application/pdf",
+    type="primary",
+)
@@ -0,0 +1,74 @@
+import streamlit as st
+
+from categorization import classification_rules
+from category_model import CATEGORY_MODEL_THRESHOLD, category_model
+
+st.title("Classification Rules")
+
+st.write(
+    "Transactions are categorized by the first rule whose pattern appears in their Details. "
+    "Edit the rules file to change them; it is reloaded the next time a statement is categorized, "
+    "and statements already parsed are recategorized when they are opened again."
+)
+
+matcher = classification_rules.matcher
+st.write(f"**Rules file:** `{classification_rules.path}`")
+st.write(f"**Version:** {matcher.version} · **Loaded:** {matcher.loaded_at:%d %b %Y %H:%M:%S}")
+if classification_rules.error:
+    st.error(f"The rules file changed but could not be loaded; the rules above are still in use. "
+             f"{classification_rules.error}")
+
+# Counters cover the rows categorized in this server process since the rules loaded
+stats = matcher.rule_stats()
+rules = stats[stats["Rule"].notna()]
+dead = rules["Rows"] == 0
+shadowed = rules["Shadowed By"].notna()
+
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Rules", f"{len(rules):,}")
+col2.metric("Rows Categorized", f"{int(stats['Rows'].sum()):,}")
+col3.metric("Rules Never Matched", f"{int(dead.sum()):,}")
+col4.metric("Shadowed Rules", f"{int(shadowed.sum()):,}")
+
+view = st.radio(
+    "Show", ["All rules", "Never matched", "Shadowed", "Most expensive"], horizontal=True,
+)
+if view == "Never matched":
+    stats = rules[dead]
+elif view == "Shadowed":
+    st.caption("A shadowed rule can never match: an earlier rule's pattern is part of its own.")
+    stats = rules[shadowed]
+elif view == "Most expensive":
+    stats = stats.sort_values("Match Time (ms)", ascending=False)
+
+st.dataframe(
+    stats, hide_index=True,
+    column_config={
+        "Match Time (ms)": st.column_config.NumberColumn(format="%.2f"),
+        "Time per Details (µs)": st.column_config.NumberColumn(format="%.1f"),
+    },
+)
+
+if st.button("Reset counters"):
+    matcher.reset_counters()
+    st.rerun()
+
+st.subheader("Fallback Model")
+model = category_model.model
+if category_model.error:
+    st.error(f"The model file changed but could not be loaded. {category_model.error}")
+if model is None:
+    st.write(
+        f"No model is trained, so rows no rule matches stay Uncategorized. "
+        f"Train one on the parsed statements with `python app/category_model.py`; it is written to "
+        f"`{category_model.path}`."
+    )
+else:
+    st.write(
+        f"Rows no rule matches are categorized by a TF-IDF and logistic regression model when it is at least "
+        f"{CATEGORY_MODEL_THRESHOLD:.0%} confident. Version {model.version}, trained "
+        f"{model.trained_at:%d %b %Y %H:%M} on {model.samples:,} distinct Details under rules {model.rules_version}."
+    )
+    col1, col2 = st.columns(2)
+    col1.metric("Uncategorized Rows Seen", f"{model.rows:,}")
+    col2.metric("Categorized by the Model", f"{model.filled:,}")
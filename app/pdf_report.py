@@ -0,0 +1,285 @@
+"""Downloadable PDF report, rendered in the background from cached chart images
+
+The report carries the overview tables and the key charts of the Your Report
+page. Charts are drawn with matplotlib, since Plotly needs an extra browser
+engine to export images, and each PNG is rasterized once and kept on disk
+under the statement hash and chart ID. The PDF is written straight to a file
+next to them, so repeat downloads only reopen that file. ReportRenderer runs
+the rendering on a background thread, one job per statement.
+"""
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.platypus import Image, KeepTogether, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from analytics import CHARGES_CATEGORIES, report_cache, report_key
+from downsampling import downsample
+
+# Where rendered charts and reports are kept, one directory per statement hash;
+# the REPORT_CACHE_DIR environment variable moves it elsewhere
+REPORT_CACHE_DIR = os.environ.get(
+    "REPORT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "report_cache")
+)
+
+# Bumped whenever the charts or the report layout change; older files are left behind
+REPORT_FORMAT_VERSION = 1
+
+REPORT_FILE = "report.pdf"
+
+# Chart size in inches and resolution of the rasterized images
+CHART_SIZE = (7.0, 3.2)
+CHART_DPI = 150
+
+# Points per line in the balance chart
+CHART_MAX_POINTS = 1000
+
+TABLE_STYLE = TableStyle([
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("FONTSIZE", (0, 0), (-1, -1), 8),
+    ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#e8f5e9")),
+    ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+    ("ALIGN", (1, 1), (-1, -1), "RIGHT"),
+])
+
+
+def draw_volume_over_time(ax, report):
+    for direction in ("Incoming", "Outgoing"):
+        counts = report.cube.totals("month", direction)["Count"]
+        ax.plot(counts.index.to_timestamp(), counts.to_numpy(), marker="o", label=direction)
+    ax.set_ylabel("Transactions")
+    ax.legend()
+
+
+def draw_category_amounts(amounts):
+    def draw(ax, report):
+        top = amounts(report).sort_values().tail(10)
+        ax.barh([str(category) for category in top.index], top.to_numpy())
+        ax.set_xlabel("Amount (KES)")
+    return draw
+
+
+def draw_balance_over_time(ax, report):
+    points = downsample(report.balance_over_time, "Completion Time", ["Balance"], CHART_MAX_POINTS)
+    ax.plot(points["Completion Time"], points["Balance"], linewidth=1)
+    ax.set_ylabel("Balance (KES)")
+
+
+def draw_charges_by_month(ax, report):
+    charges = report.cube.monthly_amounts("Outgoing", CHARGES_CATEGORIES)
+    if charges.empty:
+        ax.text(0.5, 0.5, "No charges in this statement", ha="center", va="center", transform=ax.transAxes)
+        return
+    table = charges.pivot_table(index="Month", columns="Category", values="Amount", aggfunc="sum", observed=True).fillna(0)
+    bottom = 0
+    labels = table.index.strftime("%b %Y")
+    for category in table.columns:
+        ax.bar(labels, table[category].to_numpy(), bottom=bottom, label=str(category))
+        bottom = bottom + table[category].to_numpy()
+    ax.set_ylabel("Amount (KES)")
+    ax.legend(fontsize=7)
+    ax.tick_params(axis="x", labelrotation=45, labelsize=7)
+
+
+def draw_transaction_counts(ax, report):
+    counts = report.transaction_counts.head(15).iloc[::-1]
+    ax.barh(counts["Category"].astype(str), counts["Count"].to_numpy())
+    ax.set_xlabel("Transactions")
+
+
+def draw_outgoing_by_hour(ax, report):
+    amounts = report.cube.weekday_hour_amounts("Outgoing")
+    image = ax.imshow(amounts.to_numpy(), aspect="auto", cmap="Reds")
+    ax.set_yticks(range(len(amounts.index)), [["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"][day] for day in amounts.index])
+    ax.set_xticks(range(len(amounts.columns)), [str(hour) for hour in amounts.columns], fontsize=6)
+    ax.set_xlabel("Hour of day")
+    ax.figure.colorbar(image, ax=ax, label="KES")
+
+
+# (chart ID, title, draw(ax, report)) in report order; the ID names the cached image
+CHARTS = [
+    ("volume_over_time", "Monthly Transaction Volume", draw_volume_over_time),
+    ("money_in_by_category", "Money In by Category", draw_category_amounts(lambda report: report.incoming_by_category)),
+    ("money_out_by_category", "Money Out by Category", draw_category_amounts(lambda report: report.outgoing_by_category)),
+    ("balance_over_time", "Account Balance Over Time", draw_balance_over_time),
+    ("charges_by_month", "Transaction Charges by Month", draw_charges_by_month),
+    ("transaction_counts", "Transaction Count by Category", draw_transaction_counts),
+    ("outgoing_by_hour", "Money Out by Day and Hour", draw_outgoing_by_hour),
+]
+
+
+class ReportFiles:
+    """Chart images and PDF reports on disk, under a directory per statement hash"""
+
+    def __init__(self, root=REPORT_CACHE_DIR):
+        self.root = os.path.join(root, f"v{REPORT_FORMAT_VERSION}")
+
+    def _dir(self, key):
+        return os.path.join(self.root, key)
+
+    def chart_path(self, key, chart_id):
+        return os.path.join(self._dir(key), f"{chart_id}.png")
+
+    def report_path(self, key):
+        return os.path.join(self._dir(key), REPORT_FILE)
+
+    def staging_path(self, key, suffix):
+        """A private file to write into before it is renamed into place"""
+        os.makedirs(self._dir(key), exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix=".", suffix=suffix, dir=self._dir(key))
+        os.close(fd)
+        return path
+
+
+report_files = ReportFiles()
+
+
+def chart_image(key, chart_id, draw, report, files=report_files):
+    """Path of the chart's PNG, rasterizing it only if it is not cached yet"""
+    path = files.chart_path(key, chart_id)
+    if os.path.exists(path):
+        return path
+    # The object-oriented API keeps rendering off pyplot's global state, so it is thread-safe
+    figure = Figure(figsize=CHART_SIZE, dpi=CHART_DPI)
+    FigureCanvasAgg(figure)
+    draw(figure.subplots(), report)
+    figure.tight_layout()
+    staging = files.staging_path(key, ".png")
+    figure.savefig(staging, format="png")
+    os.replace(staging, path)
+    return path
+
+
+def frame_table(frame, amount_columns=()):
+    """A reportlab Table of a DataFrame, amounts formatted with thousands separators"""
+    rows = [list(frame.columns)]
+    for record in frame.itertuples(index=False):
+        rows.append([
+            f"{value:,.2f}" if column in amount_columns else str(value)
+            for column, value in zip(frame.columns, record)
+        ])
+    table = Table(rows, hAlign="LEFT")
+    table.setStyle(TABLE_STYLE)
+    return table
+
+
+def report_story(statement, report, chart_paths):
+    """The flowables of the PDF, in page order"""
+    styles = getSampleStyleSheet()
+    info = statement.customer_info
+    story = [Paragraph("M-PESA Statement Report", styles["Title"])]
+    for label, field in (("Customer Name", "customer_name"), ("Mobile Number", "mobile_number"),
+                         ("Statement Period", "statement_period"), ("Request Date", "request_date")):
+        if info.get(field):
+            # Values come from the uploaded PDF; escape them out of Paragraph's markup
+            story.append(Paragraph(f"<b>{label}:</b> {escape(str(info[field]))}", styles["Normal"]))
+    story.append(Paragraph(f"<b>Generated:</b> {datetime.now():%d %b %Y %H:%M}", styles["Normal"]))
+
+    story += [Spacer(1, 0.4 * cm), Paragraph("Overview", styles["Heading2"])]
+    totals = pd.DataFrame({
+        "Total": ["Transactions", "Money In (KES)", "Money Out (KES)"],
+        "Value": [f"{report.total_transactions:,}", f"{report.total_incoming:,.2f}", f"{report.total_outgoing:,.2f}"],
+    })
+    story.append(frame_table(totals))
+    for title, frame, amounts in (
+        ("Top 5 Incoming Categories by Volume", report.incoming_top_categories_by_volume, ()),
+        ("Top 5 Outgoing Categories by Volume", report.outgoing_top_categories_by_volume, ()),
+        ("Top 5 Incoming Categories by Value", report.incoming_top_categories_by_value, ("Amount",)),
+        ("Top 5 Outgoing Categories by Value", report.outgoing_top_categories_by_value, ("Amount",)),
+        ("Top Senders by Amount", report.top_senders_by_amount, ("Total Amount",)),
+        ("Top Recipients by Amount", report.top_recipients_by_amount, ("Total Amount",)),
+    ):
+        if frame.empty:
+            continue
+        story.append(KeepTogether([Paragraph(title, styles["Heading4"]), frame_table(frame, amounts)]))
+
+    width = A4[0] - 4 * cm
+    height = width * CHART_SIZE[1] / CHART_SIZE[0]
+    for (_, title, _), path in zip(CHARTS, chart_paths):
+        story.append(KeepTogether([Paragraph(title, styles["Heading3"]), Image(path, width=width, height=height)]))
+    return story
+
+
+def render_report(key, statement, files=report_files, timings=None):
+    """Write the PDF report for a parsed statement and return its path
+
+    Charts already rasterized for this statement are reused. Files are kept
+    under the statement hash and the version of its classification rules.
+    ``timings``, if given, receives the seconds spent on the report
+    aggregates, the charts and the PDF.
+    """
+    clock = time.perf_counter
+    timings = {} if timings is None else timings
+
+    start = clock()
+    report = report_cache.get_or_compute(key, statement)
+    key = report_key(key, statement)
+    timings["aggregate report"] = clock() - start
+
+    start = clock()
+    chart_paths = [chart_image(key, chart_id, draw, report, files) for chart_id, _, draw in CHARTS]
+    timings["charts"] = clock() - start
+
+    start = clock()
+    staging = files.staging_path(key, ".pdf")
+    document = SimpleDocTemplate(staging, pagesize=A4, title="M-PESA Statement Report",
+                                 leftMargin=2 * cm, rightMargin=2 * cm, topMargin=2 * cm, bottomMargin=2 * cm)
+    document.build(report_story(statement, report, chart_paths))
+    path = files.report_path(key)
+    os.replace(staging, path)
+    timings["pdf"] = clock() - start
+    return path
+
+
+class ReportRenderer:
+    """Renders PDF reports on a background thread, one job per statement hash
+
+    submit() returns a Future of the report path. Reports already on disk
+    resolve at once; a statement whose report is being rendered shares the
+    running job; failed jobs are run again on the next submit. Jobs are kept
+    per statement hash and classification rules version until their report
+    is on disk.
+    """
+
+    def __init__(self, files=report_files, workers=1):
+        self.files = files
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-report")
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, statement):
+        versioned_key = report_key(key, statement)
+        with self._lock:
+            # Finished jobs are dropped: their reports resolve from disk
+            for finished in [k for k, f in self._futures.items() if f.done() and f.exception() is None]:
+                del self._futures[finished]
+            future = self._futures.get(versioned_key)
+            if future is not None and not future.done():
+                return future
+            path = self.files.report_path(versioned_key)
+            if os.path.exists(path):
+                self._futures.pop(versioned_key, None)
+                future = Future()
+                future.set_result(path)
+                return future
+            future = self._futures[versioned_key] = self._executor.submit(render_report, key, statement, self.files)
+            return future
+
+    def get(self, key, statement):
+        """The running or failed job of a statement, None once its report is on disk"""
+        with self._lock:
+            return self._futures.get(report_key(key, statement))
+
+
+report_renderer = ReportRenderer()
@@ -0,0 +1,110 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from categorization import categories_version
+from extraction import StatementStream, recategorize
+from statement_store import statement_store
+
+# Upper bound on the memory held by cached statements (bytes)
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+
+def statement_hash(file_bytes):
+    """SHA-256 of the uploaded statement bytes, used as the cache key"""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+class StatementCache:
+    """In-process LRU of parsed statements, evicting once a memory cap is reached"""
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            statement = self._entries.get(key)
+            if statement is not None:
+                self._entries.move_to_end(key)
+            return statement
+
+    def put(self, key, statement):
+        size = statement.memory_usage()
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._sizes.pop(key)
+                del self._entries[key]
+            self._entries[key] = statement
+            self._sizes[key] = size
+            self._total_bytes += size
+
+            # Evict least recently used statements, but always keep the newest one
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, _ = self._entries.popitem(last=False)
+                self._total_bytes -= self._sizes.pop(old_key)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+
+# Shared by every Streamlit session and page in this process
+statement_cache = StatementCache()
+
+
+def load_statement(file_bytes, on_batch=None):
+    """Return (hash, ParsedStatement) for the uploaded bytes, parsing only on a cache miss
+
+    Lookups go to the in-process cache first, then the on-disk statement store,
+    and only then to the PDF. While parsing, ``on_batch(stream, batch)`` is
+    called after every page so the caller can render progress.
+    """
+    key = statement_hash(file_bytes)
+    statement = get_statement(key)
+    if statement is not None:
+        return key, statement
+
+    stream = StatementStream(file_bytes)
+    for batch in stream:
+        if on_batch is not None:
+            on_batch(stream, batch)
+    statement = stream.statement
+    statement_store.save(key, statement)
+    statement_cache.put(key, statement)
+    return key, statement
+
+
+def get_statement(key):
+    """The parsed statement for a hash from the cache or the statement store, or None
+
+    Statements categorized under other classification rules, or another
+    fallback category model, are recategorized from their Details and
+    replace the cached copy.
+    """
+    statement = statement_cache.get(key)
+    if statement is None:
+        statement = statement_store.load(key)
+        if statement is not None:
+            statement_cache.put(key, statement)
+    if statement is not None and statement.rules_version != categories_version():
+        statement = recategorize(statement)
+        statement_cache.put(key, statement)
+    return statement
@@ -0,0 +1,103 @@
+import json
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from extraction import ParsedStatement, compact_transactions
+
+# Where parsed statements are persisted, one directory per statement hash;
+# the STATEMENT_STORE_DIR environment variable moves it elsewhere
+STATEMENT_STORE_DIR = os.environ.get(
+    "STATEMENT_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "statement_store")
+)
+
+# Bumped whenever the stored frames change shape; entries of older formats are
+# left behind and their statements reparsed on the next upload
+STORE_FORMAT_VERSION = 4
+
+TRANSACTIONS_FILE = "transactions.parquet"
+METADATA_FILE = "statement.json"
+
+
+class StatementStore:
+    """Typed Parquet files for parsed statements, keyed by content hash
+
+    Each statement is written to a private temporary directory and renamed
+    into place, so concurrent sessions uploading the same statement never see
+    a half-written entry. Reads memory-map the Parquet files. Entries live
+    under a directory per STORE_FORMAT_VERSION.
+    """
+
+    def __init__(self, root=STATEMENT_STORE_DIR):
+        self.root = os.path.join(root, f"v{STORE_FORMAT_VERSION}")
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self._path(key), METADATA_FILE))
+
+    def keys(self):
+        """Hashes of every complete entry, in directory order"""
+        if not os.path.isdir(self.root):
+            return
+        for name in os.listdir(self.root):
+            if not name.startswith(".") and name in self:
+                yield name
+
+    def save(self, key, statement):
+        """Persist a statement under its key; a no-op if it is already stored"""
+        if key in self:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{key}.", dir=self.root)
+        try:
+            # A RangeIndex is stored as metadata rather than a column
+            table = pa.Table.from_pandas(statement.transactions, preserve_index=None)
+            pq.write_table(table, os.path.join(staging, TRANSACTIONS_FILE))
+
+            summary_table = statement.summary_table
+            metadata = {
+                "customer_info": statement.customer_info,
+                "rules_version": statement.rules_version,
+                "summary_table": None if summary_table is None else {
+                    "columns": list(summary_table.columns),
+                    "data": summary_table.values.tolist(),
+                },
+            }
+            # The metadata file marks the entry as complete, so it is written last
+            with open(os.path.join(staging, METADATA_FILE), "w") as handle:
+                json.dump(metadata, handle)
+
+            try:
+                os.rename(staging, self._path(key))
+            except OSError:
+                # Another session stored the same statement first
+                if key not in self:
+                    raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def load(self, key):
+        """The stored ParsedStatement for a key, or None if it was never stored"""
+        if key is None or key not in self:
+            return None
+        path = self._path(key)
+        with open(os.path.join(path, METADATA_FILE)) as handle:
+            metadata = json.load(handle)
+
+        statement = ParsedStatement(customer_info=metadata["customer_info"], rules_version=metadata.get("rules_version"))
+        summary = metadata["summary_table"]
+        if summary is not None:
+            statement.summary_table = pd.DataFrame(summary["data"], columns=summary["columns"])
+        table = pq.read_table(os.path.join(path, TRANSACTIONS_FILE), memory_map=True)
+        # Parquet metadata brings strings back Python-backed; restore the compact layout
+        statement.transactions = compact_transactions(table.to_pandas())
+        return statement
+
+
+statement_store = StatementStore()
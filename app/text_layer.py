@@ -0,0 +1,119 @@
+"""Transaction table extraction straight from the PDF text layer
+
+pdfplumber's extract_tables() detects ruling lines and cells on every page,
+yet every M-PESA statement uses the same seven-column layout. ColumnLayout
+learns the column x-boundaries once, from the header row of one page, and
+then reads each page with a single extract_words() pass: words are bucketed
+into columns by their x-centre and wrapped lines are stitched into the cell
+above. Pages whose result does not validate return None so the caller can
+fall back to extract_tables() for that page.
+"""
+import bisect
+import re
+from dataclasses import dataclass
+
+RECEIPT_PATTERN = re.compile(r"^[A-Z0-9]{10}$")
+COMPLETION_TIME_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+AMOUNT_PATTERN = re.compile(r"^-?[\d,]+\.\d{2}$")
+
+# Words whose tops are this close (points) are on the same line
+LINE_TOLERANCE = 1.5
+
+# A line more than this many line heights below the previous one ends the table
+MAX_LINE_SPACING = 1.6
+
+
+@dataclass(frozen=True)
+class ColumnLayout:
+    """Header labels and column x-boundaries of the transaction table"""
+    header: tuple
+    boundaries: tuple
+
+    @classmethod
+    def learn(cls, page):
+        """Layout of the transaction table on ``page``, or None if it has none"""
+        for table in page.find_tables():
+            rows = table.extract()
+            header = tuple(rows[0]) if rows else ()
+            cells = table.rows[0].cells if table.rows else []
+            if "Receipt No." not in header or "Completion Time" not in header or any(cell is None for cell in cells):
+                continue
+            return cls(header, tuple(cell[0] for cell in cells) + (cells[-1][2],))
+        return None
+
+    def _column_index(self, label):
+        return self.header.index(label)
+
+    def _bucket(self, words):
+        """Word texts per column for one line; None if a word lies outside the table"""
+        cells = [[] for _ in self.header]
+        for word in words:
+            centre = (word["x0"] + word["x1"]) / 2
+            if not self.boundaries[0] <= centre <= self.boundaries[-1]:
+                return None
+            column = min(bisect.bisect_right(self.boundaries, centre) - 1, len(self.header) - 1)
+            cells[column].append(word["text"])
+        return cells
+
+    def extract_tables(self, page):
+        """The page's transaction table in extract_tables() form, or None if it fails validation"""
+        receipt_column = self._column_index("Receipt No.")
+        rows = []
+        current = None
+        previous = None
+        words = page.extract_words()
+        for line in text_lines(words):
+            cells = self._bucket(line["words"])
+            receipt = " ".join(cells[receipt_column]) if cells is not None else ""
+            if RECEIPT_PATTERN.match(receipt):
+                current = [[" ".join(texts)] if texts else [] for texts in cells]
+                rows.append(current)
+            elif current is not None:
+                spacing = line["top"] - previous["top"]
+                if cells is None or receipt or spacing > MAX_LINE_SPACING * (previous["bottom"] - previous["top"]):
+                    # Anything after the table (verification code, footer) ends it
+                    break
+                for parts, texts in zip(current, cells):
+                    if texts:
+                        parts.append(" ".join(texts))
+            previous = line
+
+        table = [list(self.header)] + [["\n".join(parts) for parts in row] for row in rows]
+        if not self._validate(words, table):
+            return None
+        return [table] if rows else []
+
+    def _validate(self, words, table):
+        receipt_column = self._column_index("Receipt No.")
+        time_column = self._column_index("Completion Time")
+        amount_columns = [self._column_index(label) for label in ("Paid In", "Withdrawn", "Balance") if label in self.header]
+
+        # Every receipt number printed in the receipt column must have become a row
+        receipts = sum(
+            1 for word in words
+            if RECEIPT_PATTERN.match(word["text"])
+            and self.boundaries[receipt_column] <= (word["x0"] + word["x1"]) / 2 <= self.boundaries[receipt_column + 1]
+        )
+        if receipts != len(table) - 1:
+            return False
+        for row in table[1:]:
+            if not COMPLETION_TIME_PATTERN.match(row[time_column]):
+                return False
+            if any(row[column] and not AMOUNT_PATTERN.match(row[column]) for column in amount_columns):
+                return False
+        return True
+
+
+def text_lines(words):
+    """Words grouped into lines, top to bottom, each line's words left to right"""
+    lines = []
+    for word in sorted(words, key=lambda word: (word["top"], word["x0"])):
+        if lines and word["top"] - lines[-1]["top"] <= LINE_TOLERANCE:
+            line = lines[-1]
+            line["words"].append(word)
+            line["bottom"] = max(line["bottom"], word["bottom"])
+        else:
+            lines.append({"top": word["top"], "bottom": word["bottom"], "words": [word]})
+    for line in lines:
+        line["words"].sort(key=lambda word: word["x0"])
+    return lines
@@ -1,4 +1,3 @@
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objs as go
 
@@ -16,9 +15,7 @@ class TransactionVisualizer:
     @staticmethod
     def monthly_cash_flow(df):
         """Create a line chart showing monthly income and expenses"""
-        df['Date'] = pd.to_datetime(df['Completion Time'])
-        df['Month'] = df['Date'].dt.to_period('M')
-        
+        # Month is derived from Completion Time at ingest
         monthly_income = df[df['Paid In'] > 0].groupby('Month')['Paid In'].sum()
         monthly_expenses = df[df['Withdrawn'] < 0].groupby('Month')['Withdrawn'].sum().abs()
         
@@ -60,11 +57,8 @@ class TransactionVisualizer:
     @staticmethod
     def transaction_frequency_heatmap(df):
         """Create a heatmap of transaction frequency by day and hour"""
-        df['Date'] = pd.to_datetime(df['Completion Time'])
-        df['Day'] = df['Date'].dt.day_name()
-        df['Hour'] = df['Date'].dt.hour
-        
-        transaction_heatmap = df.groupby(['Day', 'Hour']).size().unstack()
+        day = df['Completion Time'].dt.day_name().rename('Day')
+        transaction_heatmap = df.groupby([day, 'Hour']).size().unstack()
         
         return px.density_heatmap(
             z=transaction_heatmap.values,
@@ -0,0 +1,53 @@
+"""Microbenchmark: Series.apply(safe_convert_to_float) vs vectorized parse_amounts
+
+Amount cells are sampled from original_transactions.csv, formatted the way
+pdfplumber returns them ("1,234.00", "" for blanks), and repeated to --rows.
+
+    python benchmarks/bench_amounts.py [--rows 100000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "app")
+sys.path.insert(0, APP_DIR)
+
+from extraction import parse_amounts, safe_convert_to_float  # noqa: E402
+
+SAMPLE_CSV = os.path.join(APP_DIR, "original_transactions.csv")
+
+
+def sample_cells(rows):
+    """Raw amount strings as they come out of the PDF tables"""
+    amounts = pd.read_csv(SAMPLE_CSV)[["Paid In", "Withdrawn", "Balance"]].to_numpy().ravel()
+    cells = np.array(["" if np.isnan(amount) else f"{amount:,.2f}" for amount in amounts], dtype=object)
+    return pd.Series(np.resize(cells, rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    cells = sample_cells(args.rows)
+    pd.testing.assert_series_equal(cells.apply(safe_convert_to_float), parse_amounts(cells))
+
+    cases = {
+        "apply": lambda: cells.apply(safe_convert_to_float),
+        "vectorized": lambda: parse_amounts(cells),
+        "vectorized cents": lambda: parse_amounts(cells, as_cents=True),
+    }
+    baseline = None
+    for name, run in cases.items():
+        best = min(timeit.repeat(run, number=1, repeat=args.repeat))
+        baseline = baseline or best
+        print(f"{name:<17} {best * 1000:>9.2f} ms  {baseline / best:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
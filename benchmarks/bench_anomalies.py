@@ -0,0 +1,63 @@
+"""Anomaly scoring time for one large statement and for many statements in one call
+
+The synthetic 5,000-transaction statement of bench_pdf_report is scored on
+its own, then copied into a batch of statements told apart by a statement
+column and scored in one batched call, and once statement by statement for
+comparison. With --isolation-forest the first scoring also fits the forest;
+the runs after it reuse the forest cached for the same category set.
+
+    python benchmarks/bench_anomalies.py [--statements 100] [--isolation-forest]
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, os.pardir, "app")
+sys.path.insert(0, APP_DIR)
+
+from anomalies import score_transactions  # noqa: E402
+from bench_pdf_report import DEFAULT_TRANSACTIONS, fixture_statement  # noqa: E402
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transactions", type=int, default=DEFAULT_TRANSACTIONS, help="transactions per statement")
+    parser.add_argument("--statements", type=int, default=100, help="statements in the batched call")
+    parser.add_argument("--isolation-forest", action="store_true", help="also score with the IsolationForest")
+    args = parser.parse_args()
+
+    _, statement = fixture_statement(args.transactions)
+    transactions = statement.categorized_transactions()
+    forest = args.isolation_forest
+
+    scores, first = timed(score_transactions, transactions, isolation_forest=forest)
+    _, repeat = timed(score_transactions, transactions, isolation_forest=forest)
+    flagged = int(scores["Anomaly"].sum())
+    print(f"{len(transactions):,} transactions, {flagged:,} flagged")
+    print(f"  first call {first * 1000:>9.1f} ms" + ("  (fits the forest)" if forest else ""))
+    print(f"  repeat     {repeat * 1000:>9.1f} ms")
+
+    batch = pd.concat([transactions.assign(Statement=number) for number in range(args.statements)], ignore_index=True)
+    _, batched = timed(score_transactions, batch, ["Statement"], forest)
+    start = time.perf_counter()
+    for _, frame in batch.groupby("Statement", sort=False):
+        score_transactions(frame, isolation_forest=forest)
+    one_by_one = time.perf_counter() - start
+    print(f"\n{args.statements:,} statements, {len(batch):,} transactions")
+    print(f"  one call        {batched:>8.2f} s  {len(batch) / batched:>12,.0f} rows/s")
+    print(f"  one by one      {one_by_one:>8.2f} s  {len(batch) / one_by_one:>12,.0f} rows/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Coverage, accuracy and cost of the fallback category model on rows the rules miss
+
+Every category with more than one rule matching the 5,000-transaction
+statement of bench_pdf_report keeps only the first of them, so the rows the
+others matched fall to "Uncategorized" while their category is still known.
+The fallback model is trained on the Details the reduced rules categorize,
+as it would be on a real store, and fills in the rows they miss. The script reports how many of those rows the model
+categorized and how many of them match the full rules, then times the
+Details column, copied --copies times, with the reduced rules alone and
+with the model filling in. The model scores each distinct Details value
+once, so its cost should grow with the rows at the same rate as the rules'.
+
+    python benchmarks/bench_category_model.py [--copies 1 10]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, os.pardir, "app")
+sys.path.insert(0, APP_DIR)
+
+# The app reads its rules and model files from these on import
+WORK_DIR = tempfile.mkdtemp(prefix="bench-category-model-")
+os.environ["CLASSIFICATION_RULES_FILE"] = os.path.join(WORK_DIR, "classification_rules.json")
+os.environ["CATEGORY_MODEL_FILE"] = os.path.join(WORK_DIR, "category_model.pkl")
+
+from bench_pdf_report import fixture_statement  # noqa: E402
+from category_model import CATEGORY_MODEL_THRESHOLD, UNCATEGORIZED, save_model, train_model  # noqa: E402
+
+RULES_FILE = os.path.join(APP_DIR, "classification_rules.json")
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def write_rules(document, matcher):
+    """Write the rules file the app reads without the later matching rules of every category
+
+    ``matcher`` has categorized the statement, so its counters tell which
+    rules matched.
+    """
+    rules = document["rules"]
+    matched = pd.Series(matcher.rows[:len(rules)] > 0)
+    categories = pd.Series([rule["category"] for rule in rules])
+    drop = matched & categories[matched].duplicated().reindex(categories.index, fill_value=False)
+    reduced = dict(document, rules=[rule for rule, dropped in zip(rules, drop) if not dropped])
+    with open(os.environ["CLASSIFICATION_RULES_FILE"], "w") as handle:
+        json.dump(reduced, handle)
+    return [rule["pattern"] for rule, dropped in zip(rules, drop) if dropped]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, nargs="+", default=[1, 10], help="copies of the statement categorized")
+    args = parser.parse_args()
+
+    with open(RULES_FILE) as handle:
+        document = json.load(handle)
+    with open(os.environ["CLASSIFICATION_RULES_FILE"], "w") as handle:
+        json.dump(document, handle)
+    from categorization import CategoryMatcher, categorize_details, classification_rules
+
+    _, statement = fixture_statement(5000)
+    details = statement.transactions["Details"].astype(object)
+    full_rules = CategoryMatcher(classification_rules.matcher.table)
+    expected = full_rules.categorize(details)
+
+    dropped = write_rules(document, full_rules)
+    rules_only = categorize_details(details, fallback=False)
+    missed = (rules_only == UNCATEGORIZED) & (expected != UNCATEGORIZED)
+    print(f"Dropped {', '.join(dropped)}: {int(missed.sum()):,} of {len(details):,} rows left uncategorized")
+
+    (model, accuracy, coverage), seconds = timed(train_model, set(details.dropna()), classification_rules.matcher.table)
+    print(f"Trained on {model.samples:,} distinct Details in {len(model.pipeline.classes_)} categories "
+          f"in {seconds:.2f} s; held out: {coverage:.1%} predicted, {accuracy:.1%} of them correctly")
+
+    save_model(model)
+    filled = categorize_details(details)
+    recovered = missed & (filled != UNCATEGORIZED)
+    correct = recovered & (filled == expected)
+    print(f"At {CATEGORY_MODEL_THRESHOLD:.0%} confidence the model categorized {int(recovered.sum()):,} "
+          f"of the uncategorized rows, {int(correct.sum()):,} as the full rules do")
+
+    print(f"\n{'rows':>8} {'rules ms':>9} {'rules + model ms':>17}")
+    for copies in args.copies:
+        column = pd.concat([details] * copies, ignore_index=True)
+        _, rules_seconds = timed(categorize_details, column, fallback=False)
+        _, model_seconds = timed(categorize_details, column)
+        print(f"{len(column):>8,} {rules_seconds * 1000:>9.1f} {model_seconds * 1000:>17.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""Peak memory and throughput of the credit feature pipeline as the portfolio grows
+
+A synthetic portfolio is cut from the 5,000-transaction statement of
+bench_pdf_report: every statement is a 500-row slice of it under its own
+hash, spread over a fixed number of customers, written as a batch.py
+dataset in row groups under benchmarks/fixtures/. Each portfolio size is
+run through credit_features in a fresh process. The pipeline carries only
+per-customer sums between chunks, so with the customers fixed the peak
+resident memory should not follow the number of statements; the script
+exits with status 1 when the largest portfolio's peak exceeds MAX_GROWTH
+times the smallest one's.
+
+    python benchmarks/bench_credit_features.py [--statements 1000 10000]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, os.pardir, "app")
+sys.path.insert(0, APP_DIR)
+
+from bench_ingest import FIXTURES_DIR  # noqa: E402
+from bench_pdf_report import fixture_statement  # noqa: E402
+from credit_features import INPUT_COLUMNS, customer_features, dataset_chunks  # noqa: E402
+
+DEFAULT_STATEMENTS = [1000, 10000]
+ROWS_PER_STATEMENT = 500
+CUSTOMERS = 1000
+
+# Allowed ratio between the peaks of the largest and the smallest portfolio
+MAX_GROWTH = 1.5
+
+
+def portfolio_dir(statements):
+    """A batch.py output directory with ``statements`` synthetic statements, written once"""
+    path = os.path.join(FIXTURES_DIR, f"portfolio-{statements}")
+    if os.path.exists(os.path.join(path, "manifest.csv")):
+        return path
+    os.makedirs(path, exist_ok=True)
+    _, statement = fixture_statement(5000)
+    transactions = statement.categorized_transactions()[INPUT_COLUMNS[1:]]
+    transactions = transactions.astype({"Category": str, "Counterparty": str}).replace({"Counterparty": {"nan": None}})
+    slices = len(transactions) // ROWS_PER_STATEMENT
+
+    manifest = []
+    writer = None
+    for number in range(statements):
+        statement_hash = f"{number:064x}"
+        start = number % slices * ROWS_PER_STATEMENT
+        frame = transactions.iloc[start:start + ROWS_PER_STATEMENT].assign(**{"Statement Hash": statement_hash})
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(os.path.join(path, "transactions.parquet"), table.schema)
+        writer.write_table(table)
+        manifest.append({"statement_hash": statement_hash, "mobile_number": f"+2547{number % CUSTOMERS:08d}"})
+    writer.close()
+    pd.DataFrame(manifest).to_csv(os.path.join(path, "manifest.csv"), index=False)
+    return path
+
+
+def measure(path):
+    """Run the pipeline on one portfolio; prints customers, seconds and peak RSS in KiB"""
+    start = time.perf_counter()
+    features = customer_features(dataset_chunks(path))
+    seconds = time.perf_counter() - start
+    print(len(features), seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--statements", type=int, nargs="+", default=DEFAULT_STATEMENTS, help="portfolio sizes in statements")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure(args.measure)
+        return 0
+
+    sizes = sorted(args.statements)
+    peaks = {}
+    print(f"{'statements':>10} {'transactions':>13} {'customers':>10} {'seconds':>8} {'rows/s':>10} {'peak MiB':>9}")
+    for statements in sizes:
+        path = portfolio_dir(statements)
+        # A fresh process per size, so each peak is its own
+        output = subprocess.run([sys.executable, __file__, "--measure", path], capture_output=True, text=True, check=True)
+        customers, seconds, peak_kib = output.stdout.split()
+        rows = statements * ROWS_PER_STATEMENT
+        peaks[statements] = int(peak_kib)
+        print(f"{statements:>10,} {rows:>13,} {int(customers):>10,} {float(seconds):>8.1f} "
+              f"{rows / float(seconds):>10,.0f} {int(peak_kib) / 1024:>9.0f}")
+
+    growth = peaks[sizes[-1]] / peaks[sizes[0]]
+    print(f"\n{sizes[-1]:,} statements peak at {growth:.2f}x the {sizes[0]:,}-statement peak (limit {MAX_GROWTH:.1f}x)")
+    return 0 if growth <= MAX_GROWTH else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""Ingest pipeline benchmark over synthetic statements of increasing size
+
+Times each stage separately: opening the PDF, table extraction, building the
+transaction frame, amount conversion, timestamp parsing, counterparty
+extraction, classification, compaction and report aggregation.
+Statements are generated once with generate_statement.py and kept in
+benchmarks/fixtures/. Every run is appended to benchmarks/results/ingest.jsonl
+and compared with the previous run of the same extraction backend, flagging
+stages that got slower.
+
+    python benchmarks/bench_ingest.py [--sizes 1 10 100 500] [--repeat 3] [--backend text]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+import pdfplumber
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, os.pardir, "app")
+sys.path.insert(0, APP_DIR)
+
+from analytics import compute_report  # noqa: E402
+from categorization import categorize_details  # noqa: E402
+from counterparties import add_counterparties  # noqa: E402
+from extraction import (  # noqa: E402
+    AMOUNT_COLUMNS,
+    DEFAULT_BACKEND,
+    EXTRACTION_BACKENDS,
+    ParsedStatement,
+    TransactionRowBuilder,
+    add_time_dimensions,
+    compact_transactions,
+    extract_page_tables,
+    parse_amounts,
+    parse_customer_info,
+    parse_verification_code,
+)
+from generate_statement import generate_statement  # noqa: E402
+from text_layer import ColumnLayout  # noqa: E402
+
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+RESULTS_FILE = os.path.join(BENCH_DIR, "results", "ingest.jsonl")
+DEFAULT_SIZES = [1, 10, 100, 500]
+
+# A stage is reported as a regression when it is this much slower than the previous run
+REGRESSION_THRESHOLD = 0.20
+
+
+def fixture_path(pages):
+    path = os.path.join(FIXTURES_DIR, f"statement-{pages}p.pdf")
+    if not os.path.exists(path):
+        os.makedirs(FIXTURES_DIR, exist_ok=True)
+        generate_statement(path, pages)
+    return path
+
+
+def run_pipeline(path, backend=DEFAULT_BACKEND):
+    """One pass over the ingest pipeline; returns seconds per stage"""
+    timings = {}
+    clock = time.perf_counter
+
+    start = clock()
+    pdf = pdfplumber.open(path)
+    page_count = len(pdf.pages)
+    timings["open"] = clock() - start
+
+    start = clock()
+    parse_customer_info(pdf.pages[0].extract_text())
+    layout = ColumnLayout.learn(pdf.pages[1]) if backend == "text" and page_count > 1 else None
+    page_tables = [extract_page_tables(page, page_num, layout) for page_num, page in enumerate(pdf.pages)]
+    parse_verification_code(pdf.pages[-1].extract_text())
+    timings["extract tables"] = clock() - start
+    pdf.close()
+
+    start = clock()
+    rows = TransactionRowBuilder()
+    for page_num, tables in enumerate(page_tables):
+        for table in tables[1:] if page_num == 0 else tables:
+            rows.add_table(table)
+    transaction_data = rows.build()
+    transaction_data = transaction_data.drop(columns=["Statement Verification Code"], errors="ignore")
+    timings["build frame"] = clock() - start
+
+    start = clock()
+    for column in AMOUNT_COLUMNS:
+        transaction_data[column] = parse_amounts(transaction_data[column], as_cents=True)
+    timings["convert amounts"] = clock() - start
+
+    start = clock()
+    add_time_dimensions(transaction_data)
+    timings["parse timestamps"] = clock() - start
+
+    start = clock()
+    add_counterparties(transaction_data)
+    timings["counterparties"] = clock() - start
+
+    start = clock()
+    transaction_data["Category"] = categorize_details(transaction_data["Details"])
+    timings["classify"] = clock() - start
+
+    start = clock()
+    statement = ParsedStatement(transactions=compact_transactions(transaction_data))
+    timings["compact"] = clock() - start
+
+    start = clock()
+    compute_report(statement.transaction_data, statement.incoming_transactions, statement.outgoing_transactions)
+    timings["aggregate report"] = clock() - start
+
+    return page_count, len(transaction_data), timings
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_run(backend):
+    """The last saved run that used ``backend``; runs from before backends were recorded used tables"""
+    if not os.path.exists(RESULTS_FILE):
+        return None
+    with open(RESULTS_FILE) as handle:
+        runs = [json.loads(line) for line in handle if line.strip()]
+    runs = [run for run in runs if run.get("backend", "tables") == backend]
+    return runs[-1] if runs else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="statement sizes in pages")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size; the fastest is kept")
+    parser.add_argument("--backend", choices=EXTRACTION_BACKENDS, default=DEFAULT_BACKEND, help=f"table extraction backend (default: {DEFAULT_BACKEND})")
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the results file")
+    args = parser.parse_args()
+
+    baseline = previous_run(args.backend)
+    run = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "backend": args.backend,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "pdfplumber": pdfplumber.__version__,
+        "results": {},
+    }
+
+    for pages in args.sizes:
+        path = fixture_path(pages)
+        best = {}
+        for _ in range(args.repeat):
+            page_count, transactions, timings = run_pipeline(path, args.backend)
+            for stage, seconds in timings.items():
+                best[stage] = min(seconds, best.get(stage, seconds))
+        run["results"][str(pages)] = {"transactions": transactions, "seconds": best}
+
+        print(f"\n{page_count} pages, {transactions:,} transactions")
+        previous = (baseline or {}).get("results", {}).get(str(pages), {}).get("seconds", {})
+        for stage, seconds in best.items():
+            line = f"  {stage:<17} {seconds * 1000:>10.1f} ms"
+            if stage in previous and previous[stage] > 0:
+                change = seconds / previous[stage] - 1
+                line += f"  {change:+7.1%}"
+                if change > REGRESSION_THRESHOLD:
+                    line += "  REGRESSION"
+            print(line)
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        with open(RESULTS_FILE, "a") as handle:
+            handle.write(json.dumps(run) + "\n")
+        print(f"\nResults appended to {os.path.relpath(RESULTS_FILE)}")
+
+
+if __name__ == "__main__":
+    main()
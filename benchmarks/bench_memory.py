@@ -0,0 +1,76 @@
+"""Memory held per statement: the old three-frame layout against the compact one
+
+Before the compact layout every session kept transaction_data,
+incoming_transactions and outgoing_transactions as separate frames with
+float shilling amounts and one Python string object per text cell. Now a
+statement keeps a single frame with Int64 cents, Categorical text columns and
+Arrow-backed receipt numbers, and derives the shilling views on access. Both
+layouts are built from the same parsed statement and measured with
+DataFrame.memory_usage(deep=True).
+
+    python benchmarks/bench_memory.py [statement.pdf]
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, os.pardir, "app")
+sys.path.insert(0, APP_DIR)
+
+from extraction import parse_statement  # noqa: E402
+
+SAMPLE_STATEMENT = os.path.join(APP_DIR, "temp_mpesa_statement.pdf")
+
+
+def legacy_frame(frame):
+    """``frame`` with Categorical and Arrow string columns back to object dtype"""
+    legacy = frame.copy()
+    for column in legacy.columns:
+        dtype = legacy[column].dtype
+        if isinstance(dtype, (pd.CategoricalDtype, pd.StringDtype)):
+            legacy[column] = legacy[column].astype(object)
+    return legacy
+
+
+def column_bytes(frame):
+    return frame.memory_usage(index=False, deep=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("statement", nargs="?", default=SAMPLE_STATEMENT, help="statement PDF (default: the sample statement)")
+    args = parser.parse_args()
+
+    statement = parse_statement(args.statement, workers=1)
+    before = [
+        legacy_frame(statement.transaction_data),
+        legacy_frame(statement.incoming_transactions),
+        legacy_frame(statement.outgoing_transactions),
+    ]
+    after = statement.transactions
+
+    table = pd.DataFrame({
+        "before": pd.concat([column_bytes(frame) for frame in before]).groupby(level=0).sum().reindex(after.columns),
+        "after": column_bytes(after),
+        "dtype": after.dtypes.astype(str),
+    })
+    table.loc["(index)"] = [
+        sum(int(frame.index.memory_usage()) for frame in before),
+        int(after.index.memory_usage()),
+        type(after.index).__name__,
+    ]
+
+    total_before = int(table["before"].sum())
+    total_after = int(table["after"].sum())
+    print(f"{os.path.basename(args.statement)}: {len(after):,} transactions\n")
+    print(f"{'column':<22} {'before':>10} {'after':>10}  dtype")
+    for column, row in table.iterrows():
+        print(f"{column:<22} {int(row['before']):>10,} {int(row['after']):>10,}  {row['dtype']}")
+    print(f"{'total':<22} {total_before:>10,} {total_after:>10,}  ({total_after / total_before:.0%} of before)")
+
+
+if __name__ == "__main__":
+    main()
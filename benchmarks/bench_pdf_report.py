@@ -0,0 +1,119 @@
+"""PDF report generation time for a large statement, cold and with cached charts
+
+A synthetic statement (5,000 transactions by default) is generated and parsed
+once; the parsed statement is kept in a statement store under
+benchmarks/fixtures/ so later runs skip the PDF. The report is then rendered
+twice into an empty report cache: the cold run rasterizes every chart, the
+warm run reuses the cached images the way a repeat download does. Each run is
+appended to benchmarks/results/pdf_report.jsonl and compared with the
+previous one, flagging stages that got slower.
+
+    python benchmarks/bench_pdf_report.py [--transactions 5000] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, os.pardir, "app")
+sys.path.insert(0, APP_DIR)
+
+from bench_ingest import FIXTURES_DIR, REGRESSION_THRESHOLD, git_commit  # noqa: E402
+from extraction import parse_statement  # noqa: E402
+from generate_statement import ROWS_PER_PAGE, generate_statement  # noqa: E402
+from pdf_report import CHARTS, ReportFiles, render_report  # noqa: E402
+from statement_cache import statement_hash  # noqa: E402
+from statement_store import StatementStore  # noqa: E402
+
+RESULTS_FILE = os.path.join(BENCH_DIR, "results", "pdf_report.jsonl")
+DEFAULT_TRANSACTIONS = 5000
+
+
+def fixture_statement(transactions):
+    """(hash, ParsedStatement) of a synthetic statement, parsed once and then stored"""
+    path = os.path.join(FIXTURES_DIR, f"statement-{transactions}t.pdf")
+    if not os.path.exists(path):
+        os.makedirs(FIXTURES_DIR, exist_ok=True)
+        generate_statement(path, -(-transactions // ROWS_PER_PAGE), transactions)
+    with open(path, "rb") as handle:
+        key = statement_hash(handle.read())
+
+    store = StatementStore(os.path.join(FIXTURES_DIR, "store"))
+    statement = store.load(key)
+    if statement is None:
+        print(f"Parsing {os.path.basename(path)} once; later runs load it from the fixture store")
+        statement = parse_statement(path, backend="text")
+        store.save(key, statement)
+    return key, statement
+
+
+def render_timings(key, statement, repeat):
+    """Fastest cold and warm timings over ``repeat`` fresh report caches"""
+    best = {}
+    for attempt in range(repeat):
+        # A key of its own misses the report cache; a fresh directory misses the chart cache
+        run_key = f"{key}-{attempt}"
+        with tempfile.TemporaryDirectory(prefix="bench-report-") as root:
+            files = ReportFiles(root)
+            for run in ("cold", "warm"):
+                timings = {}
+                path = render_report(run_key, statement, files, timings)
+                timings["total"] = sum(timings.values())
+                for stage, seconds in timings.items():
+                    name = f"{run} {stage}"
+                    best[name] = min(seconds, best.get(name, seconds))
+            size = os.path.getsize(path)
+    return best, size
+
+
+def previous_run(transactions):
+    if not os.path.exists(RESULTS_FILE):
+        return None
+    with open(RESULTS_FILE) as handle:
+        runs = [json.loads(line) for line in handle if line.strip()]
+    runs = [run for run in runs if run["transactions"] == transactions]
+    return runs[-1] if runs else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transactions", type=int, default=DEFAULT_TRANSACTIONS, help="transactions in the statement")
+    parser.add_argument("--repeat", type=int, default=3, help="runs; the fastest is kept")
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the results file")
+    args = parser.parse_args()
+
+    key, statement = fixture_statement(args.transactions)
+    best, size = render_timings(key, statement, args.repeat)
+
+    baseline = (previous_run(args.transactions) or {}).get("seconds", {})
+    print(f"\n{len(statement.transactions):,} transactions, {len(CHARTS)} charts, {size / 1024:,.0f} KiB PDF")
+    for stage, seconds in best.items():
+        line = f"  {stage:<22} {seconds * 1000:>9.1f} ms"
+        if baseline.get(stage):
+            change = seconds / baseline[stage] - 1
+            line += f"  {change:+7.1%}"
+            if change > REGRESSION_THRESHOLD:
+                line += "  REGRESSION"
+        print(line)
+
+    if not args.no_save:
+        run = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "transactions": args.transactions,
+            "pdf_bytes": size,
+            "seconds": best,
+        }
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        with open(RESULTS_FILE, "a") as handle:
+            handle.write(json.dumps(run) + "\n")
+        print(f"\nResults appended to {os.path.relpath(RESULTS_FILE)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Peak memory of parsing a statement, checked to stay flat as page count grows
+
+Statements are parsed in one sweep that releases each page's parsed layout as
+soon as its tables and text are read, so peak memory should be governed by
+the transactions kept, not by the number of pages. This script parses
+synthetic statements of increasing size under tracemalloc and exits with
+status 1 when the largest statement's peak exceeds MAX_GROWTH times the
+smallest one's. Extraction runs serially; worker processes are not traced.
+
+    python benchmarks/bench_peak_memory.py [--sizes 10 50 100] [--backend text]
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, os.pardir, "app")
+sys.path.insert(0, APP_DIR)
+
+from bench_ingest import fixture_path  # noqa: E402
+from extraction import DEFAULT_BACKEND, EXTRACTION_BACKENDS, parse_statement  # noqa: E402
+
+DEFAULT_SIZES = [10, 50, 100]
+
+# Allowed ratio between the peaks of the largest and the smallest statement
+MAX_GROWTH = 3.0
+
+
+def peak_bytes(path, backend):
+    """(transactions, peak traced bytes) of parsing ``path``"""
+    tracemalloc.start()
+    try:
+        statement = parse_statement(path, workers=1, backend=backend)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return len(statement.transactions), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="statement sizes in pages")
+    parser.add_argument("--backend", choices=EXTRACTION_BACKENDS, default=DEFAULT_BACKEND, help=f"table extraction backend (default: {DEFAULT_BACKEND})")
+    args = parser.parse_args()
+
+    sizes = sorted(args.sizes)
+    peaks = {}
+    print(f"{'pages':>6} {'transactions':>13} {'peak MiB':>9} {'KiB/page':>9}")
+    for pages in sizes:
+        transactions, peak = peak_bytes(fixture_path(pages), args.backend)
+        peaks[pages] = peak
+        print(f"{pages:>6} {transactions:>13,} {peak / 2**20:>9.1f} {peak / 2**10 / pages:>9.1f}")
+
+    growth = peaks[sizes[-1]] / peaks[sizes[0]]
+    print(f"\n{sizes[-1]} pages peak at {growth:.1f}x the {sizes[0]}-page peak (limit {MAX_GROWTH:.1f}x)")
+    return 0 if growth <= MAX_GROWTH else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Peak memory and time of building the transaction frame for a 200-page statement
+
+Compares the old per-table pd.concat accumulation with TransactionRowBuilder.
+Table extraction is done once up front and replicated, and each strategy runs
+in its own process so their tracemalloc peaks are measured separately.
+
+    python benchmarks/bench_row_builder.py [--pages 200]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+import pdfplumber
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "app")
+sys.path.insert(0, APP_DIR)
+
+from extraction import TransactionRowBuilder  # noqa: E402
+
+SAMPLE_PDF = os.path.join(APP_DIR, "temp_mpesa_statement.pdf")
+
+
+def sample_page_tables(pages):
+    """Real tables from the sample statement, repeated to the requested page count"""
+    with pdfplumber.open(SAMPLE_PDF) as pdf:
+        tables = [page.extract_tables() for page in pdf.pages]
+    return [tables[page_num % len(tables)] for page_num in range(pages)]
+
+
+def build_with_concat(page_tables):
+    transaction_data = pd.DataFrame()
+    for tables in page_tables:
+        for table in tables:
+            temp_df = pd.DataFrame(table[1:], columns=table[0])
+            temp_df.columns = list(temp_df.columns[:-1]) + ["Balance"]
+            temp_df.dropna(how="any", inplace=True)
+            transaction_data = pd.concat([transaction_data, temp_df], ignore_index=True)
+    return transaction_data
+
+
+def build_with_row_builder(page_tables):
+    rows = TransactionRowBuilder()
+    for tables in page_tables:
+        for table in tables:
+            rows.add_table(table)
+    return rows.build()
+
+
+STRATEGIES = {
+    "concat": build_with_concat,
+    "row builder": build_with_row_builder,
+}
+
+
+def measure(name, page_tables):
+    """Run one strategy; returns rows, seconds and the traced peak in bytes"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    frame = STRATEGIES[name](page_tables)
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(frame), elapsed, traced_peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    args = parser.parse_args()
+
+    page_tables = sample_page_tables(args.pages)
+    print(f"{'strategy':<12} {'rows':>7}  {'time':>10}  {'peak memory':>12}")
+    context = multiprocessing.get_context("spawn")
+    for name in STRATEGIES:
+        with context.Pool(1) as pool:
+            rows, elapsed, traced_peak = pool.apply(measure, (name, page_tables))
+        print(f"{name:<12} {rows:>7,}  {elapsed * 1000:>7.1f} ms  {traced_peak / 2**20:>8.2f} MiB")
+
+    pd.testing.assert_frame_equal(build_with_concat(page_tables), build_with_row_builder(page_tables))
+
+
+if __name__ == "__main__":
+    main()
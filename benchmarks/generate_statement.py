@@ -0,0 +1,157 @@
+"""Render synthetic M-PESA statement PDFs for benchmarking the ingest pipeline
+
+Details and amounts are sampled from app/original_transactions.csv, so the
+generated statements go through the same table layout, multi-line Details
+and category patterns as a real one. Every page carries its own bordered
+transaction table with a header row; the first page adds the customer header
+and a summary table, and the last page the Statement Verification Code.
+
+    python benchmarks/generate_statement.py out.pdf --pages 100 [--transactions 2000]
+"""
+import argparse
+import os
+import random
+import string
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape
+
+import pandas as pd
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "app")
+SAMPLE_CSV = os.path.join(APP_DIR, "original_transactions.csv")
+
+COLUMNS = ["Receipt No.", "Completion Time", "Details", "Transaction Status", "Paid In", "Withdrawn", "Balance"]
+COLUMN_WIDTHS = [60, 76, 166, 78, 54, 54, 54]
+
+# Transactions per page that reliably fit on one A4 page with wrapped Details
+ROWS_PER_PAGE = 18
+
+CELL_STYLE = ParagraphStyle("cell", fontName="Helvetica", fontSize=7, leading=8.5)
+TEXT_STYLE = ParagraphStyle("text", fontName="Helvetica", fontSize=9, leading=12)
+TABLE_STYLE = TableStyle([
+    ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
+    ("FONT", (0, 0), (-1, -1), "Helvetica", 7),
+    ("FONT", (0, 0), (-1, 0), "Helvetica-Bold", 7),
+    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+])
+
+
+def load_samples():
+    """(Details, signed amount) pairs from the sample statement"""
+    sample = pd.read_csv(SAMPLE_CSV)
+    amounts = sample["Paid In"].fillna(sample["Withdrawn"])
+    return [
+        (" ".join(details.split()), amount)
+        for details, amount in zip(sample["Details"], amounts)
+        if isinstance(details, str) and pd.notna(amount)
+    ]
+
+
+def synthetic_transactions(count, seed=0, end=datetime(2024, 11, 19, 14, 0, 0)):
+    """Rows newest first, like a real statement, with a consistent running balance"""
+    rng = random.Random(seed)
+    samples = load_samples()
+    picked = [rng.choice(samples) for _ in range(count)]
+
+    # Walk forward in time to build balances, then emit newest first
+    balance = 5_000.0
+    moments = []
+    moment = end
+    for _ in range(count):
+        moment -= timedelta(seconds=rng.randint(60, 36 * 3600))
+        moments.append(moment)
+    moments.reverse()
+
+    rows = []
+    for moment, (details, amount) in zip(moments, picked):
+        balance = max(balance + amount, 0.0)
+        receipt = "".join(rng.choices(string.ascii_uppercase + string.digits, k=10))
+        rows.append([
+            receipt,
+            moment.strftime("%Y-%m-%d %H:%M:%S"),
+            details,
+            "Completed",
+            f"{amount:,.2f}" if amount >= 0 else "",
+            f"{amount:,.2f}" if amount < 0 else "",
+            f"{balance:,.2f}",
+        ])
+    rows.reverse()
+    return rows, moments[0], end
+
+
+def transaction_table(rows):
+    body = [[Paragraph(escape(cell), CELL_STYLE) if index == 2 else cell for index, cell in enumerate(row)] for row in rows]
+    table = Table([COLUMNS] + body, colWidths=COLUMN_WIDTHS)
+    table.setStyle(TABLE_STYLE)
+    return table
+
+
+def summary_table(rows):
+    paid_in = sum(float(row[4].replace(",", "")) for row in rows if row[4])
+    paid_out = sum(float(row[5].replace(",", "")) for row in rows if row[5])
+    table = Table([
+        ["TRANSACTION TYPE", "PAID IN", "PAID OUT"],
+        ["TOTAL:", f"{paid_in:,.2f}", f"{paid_out:,.2f}"],
+    ], colWidths=[160, 90, 90])
+    table.setStyle(TABLE_STYLE)
+    return table
+
+
+def generate_statement(path, pages, transactions=None, seed=0):
+    """Write a statement with ``pages`` pages and ``transactions`` rows to ``path``"""
+    if transactions is None:
+        transactions = pages * ROWS_PER_PAGE
+    if transactions > pages * ROWS_PER_PAGE:
+        raise ValueError(f"at most {ROWS_PER_PAGE} transactions fit on a page")
+
+    rows, start, end = synthetic_transactions(transactions, seed)
+    per_page = [rows[page_num * transactions // pages:(page_num + 1) * transactions // pages] for page_num in range(pages)]
+
+    story = [
+        Paragraph("M-PESA STATEMENT", TEXT_STYLE),
+        Paragraph("Customer Name: Jane Wanjiru Kamau", TEXT_STYLE),
+        Paragraph("Mobile Number: 0712345678", TEXT_STYLE),
+        Paragraph("Email Address: jane.kamau@example.com", TEXT_STYLE),
+        Paragraph(f"Statement Period: {start:%d %b %Y} - {end:%d %b %Y}", TEXT_STYLE),
+        Paragraph(f"Request Date: {end:%d %b %Y}", TEXT_STYLE),
+        Spacer(1, 6),
+        summary_table(rows),
+        Spacer(1, 6),
+    ]
+    for page_num, page_rows in enumerate(per_page):
+        if page_num:
+            story.append(PageBreak())
+        if page_rows:
+            story.append(transaction_table(page_rows))
+
+    verification = Table([
+        ["Statement Verification Code", "To verify the validity of this M-PESA statement dial *334#."],
+        ["", None],
+        ["SYN" + "".join(random.Random(seed).choices(string.ascii_uppercase + string.digits, k=5)), None],
+    ], colWidths=[120, 300])
+    verification.setStyle(TABLE_STYLE)
+    # Real statements merge the instruction cell down, which pdfplumber reports as None
+    verification.setStyle(TableStyle([("SPAN", (1, 0), (1, 2))]))
+    story += [Spacer(1, 6), verification]
+
+    document = SimpleDocTemplate(path, pagesize=A4, leftMargin=20, rightMargin=20, topMargin=20, bottomMargin=20)
+    document.build(story)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", help="PDF file to write")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--transactions", type=int, default=None, help=f"default: {ROWS_PER_PAGE} per page")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_statement(args.output, args.pages, args.transactions, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Load test for the HTTP analysis API at increasing concurrency
+
+Starts app/api.py on a free port with a throwaway statement store (or targets
+a running server with --url), then for each concurrency level has that many
+clients submit statements back to back. Every request uploads the same
+statement with a unique trailing comment, so the server parses each one
+instead of answering from its cache. A request's latency runs from the first
+POST until its report and transactions have been fetched; 503 responses are
+retried after Retry-After and counted as rejections.
+
+    python benchmarks/load_test_api.py [--concurrency 1 2 4 8] [--requests 16] [statement.pdf]
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, os.pardir, "app")
+
+SAMPLE_STATEMENT = os.path.join(APP_DIR, "temp_mpesa_statement.pdf")
+DEFAULT_CONCURRENCY = [1, 2, 4, 8]
+
+# Longest a client lets one POST block before falling back to polling
+WAIT_SECONDS = 60
+
+
+def request(method, url, body=None):
+    """(status, headers, body bytes) of one HTTP request; error statuses are returned, not raised"""
+    req = urllib.request.Request(url, data=body, method=method)
+    if body is not None:
+        req.add_header("Content-Type", "application/pdf")
+    try:
+        with urllib.request.urlopen(req, timeout=WAIT_SECONDS * 2) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.headers, error.read()
+
+
+def analyze(base_url, file_bytes):
+    """Submit one statement and fetch its results; returns the number of 503s seen"""
+    rejections = 0
+    while True:
+        status, headers, body = request("POST", f"{base_url}/statements?wait={WAIT_SECONDS}", file_bytes)
+        if status != 503:
+            break
+        rejections += 1
+        time.sleep(float(headers.get("Retry-After", 1)))
+    if status not in (200, 202):
+        raise RuntimeError(f"POST /statements returned {status}: {body[:200]!r}")
+
+    job = json.loads(body)
+    while job["status"] not in ("done", "failed"):
+        time.sleep(0.1)
+        _, _, body = request("GET", f"{base_url}/statements/{job['statement_id']}")
+        job = json.loads(body)
+    if job["status"] == "failed":
+        raise RuntimeError(f"Parsing failed: {job.get('error')}")
+
+    for resource in ("transactions", "report"):
+        link = job["links"][resource]
+        status, _, body = request("GET", base_url + link)
+        if status != 200:
+            raise RuntimeError(f"GET {link} returned {status}: {body[:200]!r}")
+    return rejections
+
+
+def run_level(base_url, statement_bytes, concurrency, total):
+    """Latencies, wall time and rejections for ``total`` requests from ``concurrency`` clients"""
+    counter = itertools.count()
+    latencies = []
+    rejections = []
+    errors = []
+    lock = threading.Lock()
+
+    def client():
+        while next(counter) < total:
+            file_bytes = statement_bytes + f"\n%load-test {uuid.uuid4()}\n".encode()
+            start = time.perf_counter()
+            try:
+                rejected = analyze(base_url, file_bytes)
+            except Exception as error:
+                with lock:
+                    errors.append(error)
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                rejections.append(rejected)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - start, sum(rejections), errors
+
+
+def start_server(workers, max_pending, store_dir):
+    """Run app/api.py on a free port; returns (process, base URL)"""
+    command = [sys.executable, os.path.join(APP_DIR, "api.py"), "--port", "0", "--quiet"]
+    if workers:
+        command += ["--workers", str(workers)]
+    if max_pending:
+        command += ["--max-pending", str(max_pending)]
+    env = dict(os.environ, STATEMENT_STORE_DIR=store_dir)
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, env=env)
+    # First line: "Serving statement analysis on http://host:port with N worker(s)"
+    line = server.stdout.readline()
+    if not line.startswith("Serving"):
+        server.kill()
+        raise RuntimeError(f"API server did not start: {line!r}")
+    return server, line.split()[4]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("statement", nargs="?", default=SAMPLE_STATEMENT, help="statement PDF (default: the sample statement)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY, help="concurrent clients per level")
+    parser.add_argument("--requests", type=int, default=16, help="statements submitted per level")
+    parser.add_argument("--url", default=None, help="test a running server instead of starting one")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes of the started server")
+    parser.add_argument("--max-pending", type=int, default=None, help="queue bound of the started server")
+    args = parser.parse_args()
+
+    with open(args.statement, "rb") as handle:
+        statement_bytes = handle.read()
+
+    server = None
+    with tempfile.TemporaryDirectory(prefix="load-test-store-") as store_dir:
+        base_url = args.url
+        if base_url is None:
+            server, base_url = start_server(args.workers, args.max_pending, store_dir)
+        try:
+            _, _, body = request("GET", f"{base_url}/health")
+            health = json.loads(body)
+            print(f"{base_url}: {health['workers']} worker(s), max {health['max_pending']} pending")
+            print(f"{os.path.basename(args.statement)}, {args.requests} requests per level\n")
+            print(f"{'clients':>7} {'p50 s':>8} {'p95 s':>8} {'req/s':>8} {'503s':>6} {'errors':>7}")
+            for concurrency in args.concurrency:
+                latencies, wall, rejections, errors = run_level(base_url, statement_bytes, concurrency, args.requests)
+                p50, p95 = np.percentile(latencies, [50, 95]) if latencies else (float("nan"), float("nan"))
+                print(f"{concurrency:>7} {p50:>8.2f} {p95:>8.2f} {len(latencies) / wall:>8.2f} {rejections:>6} {len(errors):>7}")
+                for error in errors[:3]:
+                    print(f"        {type(error).__name__}: {error}")
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
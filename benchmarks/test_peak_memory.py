@@ -0,0 +1,22 @@
+"""Fails when the peak memory of parsing grows with the page count
+
+The check of bench_peak_memory on its 10- and 100-page statements, run by
+pytest so a regression fails without anyone reading the bench output.
+
+    python -m pytest benchmarks/test_peak_memory.py
+"""
+import pytest
+
+from bench_ingest import fixture_path
+from bench_peak_memory import MAX_GROWTH, peak_bytes
+from extraction import EXTRACTION_BACKENDS
+
+
+@pytest.mark.parametrize("backend", EXTRACTION_BACKENDS)
+def test_peak_memory_stays_flat_as_pages_grow(backend):
+    small_transactions, small_peak = peak_bytes(fixture_path(10), backend)
+    large_transactions, large_peak = peak_bytes(fixture_path(100), backend)
+
+    assert large_transactions > 5 * small_transactions
+    growth = large_peak / small_peak
+    assert growth <= MAX_GROWTH, f"100 pages peak at {growth:.1f}x the 10-page peak (limit {MAX_GROWTH:.1f}x)"